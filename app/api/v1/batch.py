@@ -0,0 +1,12 @@
+from uuid import UUID
+
+from core.config import settings
+from pydantic import BaseModel, Field
+
+
+class BatchRequest(BaseModel):
+    ids: list[UUID] = Field(
+        description="Идентификаторы, ответ содержит null для ненайденных",
+        min_length=1,
+        max_length=settings.batch_max_ids,
+    )
@@ -0,0 +1,26 @@
+from typing import Annotated, AsyncIterator
+
+import orjson
+from core.config import settings
+from fastapi import Query
+from fastapi.responses import StreamingResponse
+
+BatchSize = Annotated[
+    int,
+    Query(
+        description="Документов в одном запросе к Elasticsearch",
+        ge=1,
+        le=settings.max_result_window,
+    ),
+]
+Fields = Annotated[list[str] | None, Query(description="Поля документа для выгрузки")]
+
+
+async def ndjson_lines(batches: AsyncIterator[list[dict]]) -> AsyncIterator[bytes]:
+    async for batch in batches:
+        yield b"".join(orjson.dumps(document) + b"\n" for document in batch)
+
+
+def ndjson_response(batches: AsyncIterator[list[dict]]) -> StreamingResponse:
+    """Stream documents as NDJSON, one chunk per fetched batch."""
+    return StreamingResponse(ndjson_lines(batches), media_type="application/x-ndjson")
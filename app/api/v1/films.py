@@ -2,12 +2,18 @@ from http import HTTPStatus
 from typing import Annotated, List, Literal
 from uuid import UUID
 
+from api.v1.batch import BatchRequest
+from api.v1.export import BatchSize, Fields, ndjson_response
 from core import config
+from core.config import settings
 from core.logger import logger
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from models.base import OrjsonBaseModel
+from models.film import FilmDetail, FilmPage
 from pydantic import BaseModel
 from services.film import FilmService, get_film_service
+from services.pagination import PaginationError
 
 router = APIRouter()
 
@@ -39,6 +45,35 @@ class FilmDetailResponse(BaseModel):
     directors: List[PersonResponse]
 
 
+CURSOR_DESCRIPTION = (
+    "Курсор следующей страницы из заголовка X-Next-Cursor, "
+    "при его передаче page_number игнорируется"
+)
+
+
+FilmField = Literal["uuid", "title", "imdb_rating"]
+
+
+def films_page_response(
+    page: FilmPage | None, response: Response, fields: list[FilmField] | None = None
+) -> List[FilmResponse] | ORJSONResponse:
+    if page is None:
+        return []
+    headers = {"X-Next-Cursor": page.next_cursor} if page.next_cursor else {}
+    films = [
+        FilmResponse(uuid=film.id, title=film.title, imdb_rating=film.imdb_rating)
+        for film in page.films
+    ]
+    if fields:
+        # A partial representation does not match FilmResponse, serialize it as is.
+        return ORJSONResponse(
+            [film.model_dump(mode="json", include=set(fields)) for film in films],
+            headers=headers,
+        )
+    response.headers.update(headers)
+    return films
+
+
 @router.get(
     "/",
     response_model=list[FilmResponse],
@@ -46,6 +81,7 @@ class FilmDetailResponse(BaseModel):
     description="Получить список фильмов",
 )
 async def films_list(
+    response: Response,
     sort: Annotated[
         list[Literal["imdb_rating", "-imdb_rating"]],
         Query(description="Sort by imdb_rating"),
@@ -54,12 +90,16 @@ async def films_list(
     film_service: FilmService = Depends(get_film_service),
     page_size: Annotated[int, Query(description="Фильмов на страницу", ge=1)] = 50,
     page_number: Annotated[int, Query(description="Номер страницы", ge=1)] = 1,
+    cursor: Annotated[str | None, Query(description=CURSOR_DESCRIPTION)] = None,
+    fields: Annotated[
+        list[FilmField] | None, Query(description="Поля фильма в ответе")
+    ] = None,
 ) -> List[FilmResponse]:
-    films = await film_service.get_list(sort, genre, page_size, page_number)
-    return [
-        FilmResponse(uuid=film.id, title=film.title, imdb_rating=film.imdb_rating)
-        for film in films
-    ]
+    try:
+        page = await film_service.get_list(sort, genre, page_size, page_number, cursor)
+    except PaginationError as error:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=str(error))
+    return films_page_response(page, response, fields)
 
 
 @router.get(
@@ -69,16 +109,48 @@ async def films_list(
     description="Получить список найденных фильмов",
 )
 async def search_film(
+    response: Response,
     query: Annotated[str, Query(description="Запрос")],
     film_service: FilmService = Depends(get_film_service),
     page_size: Annotated[int, Query(description="Фильмов на страницу", ge=1)] = 50,
     page_number: Annotated[int, Query(description="Номер страницы", ge=1)] = 1,
+    cursor: Annotated[str | None, Query(description=CURSOR_DESCRIPTION)] = None,
+    fields: Annotated[
+        list[FilmField] | None, Query(description="Поля фильма в ответе")
+    ] = None,
 ):
-    films = await film_service.search_film(query, page_size, page_number)
-    return [
-        FilmResponse(uuid=film.id, title=film.title, imdb_rating=film.imdb_rating)
-        for film in films
-    ]
+    try:
+        page = await film_service.search_film(query, page_size, page_number, cursor)
+    except PaginationError as error:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=str(error))
+    return films_page_response(page, response, fields)
+
+
+@router.get(
+    "/export",
+    summary="Выгрузка фильмов",
+    description="Потоковая выгрузка всех фильмов в формате NDJSON",
+    response_class=StreamingResponse,
+)
+async def export_films(
+    film_service: FilmService = Depends(get_film_service),
+    batch_size: BatchSize = settings.export_batch_size,
+    fields: Fields = None,
+) -> StreamingResponse:
+    return ndjson_response(film_service.export(batch_size, fields))
+
+
+@router.post(
+    "/batch",
+    response_model=list[FilmDetailResponse | None],
+    summary="Информация по нескольким фильмам",
+    description="Полная информация по списку фильмов в порядке запроса",
+)
+async def films_batch(
+    batch: BatchRequest, film_service: FilmService = Depends(get_film_service)
+) -> list[FilmDetailResponse | None]:
+    films = await film_service.get_many(batch.ids)
+    return [film_detail_response(film) if film else None for film in films]
 
 
 @router.get(
@@ -97,6 +169,10 @@ async def genre_details(
             status_code=HTTPStatus.NOT_FOUND, detail=f"film with id {film_id} not found"
         )
 
+    return film_detail_response(film_detail)
+
+
+def film_detail_response(film_detail: FilmDetail) -> FilmDetailResponse:
     return FilmDetailResponse(
         id=str(film_detail.id),
         title=film_detail.title,
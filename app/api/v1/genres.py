@@ -2,7 +2,11 @@ from http import HTTPStatus
 from typing import Annotated
 from uuid import UUID
 
+from api.v1.batch import BatchRequest
+from api.v1.export import BatchSize, Fields, ndjson_response
+from core.config import settings
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from models.base import OrjsonBaseModel
 from services.genre import GenreService, get_genre_service
 
@@ -32,6 +36,34 @@ async def genre_list(
     ]
 
 
+@router.get(
+    '/export',
+    summary='Выгрузка жанров',
+    description='Потоковая выгрузка всех жанров в формате NDJSON',
+    response_class=StreamingResponse,
+)
+async def export_genres(
+    genre_service: GenreService = Depends(get_genre_service),
+    batch_size: BatchSize = settings.export_batch_size,
+    fields: Fields = None,
+) -> StreamingResponse:
+    return ndjson_response(genre_service.export(batch_size, fields))
+
+
+@router.post(
+    '/batch',
+    response_model=list[Genre | None],
+    summary='Данные по нескольким жанрам',
+    description='Данные по списку жанров в порядке запроса',
+)
+async def genres_batch(
+    batch: BatchRequest,
+    genre_service: GenreService = Depends(get_genre_service),
+):
+    genres = await genre_service.get_many(batch.ids)
+    return [Genre(uuid=genre.id, name=genre.name) if genre else None for genre in genres]
+
+
 @router.get(
     '/{genre_id}',
     response_model=Genre,
@@ -2,7 +2,11 @@ from http import HTTPStatus
 from typing import Annotated
 from uuid import UUID
 
+from api.v1.batch import BatchRequest
+from api.v1.export import BatchSize, Fields, ndjson_response
+from core.config import settings
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from models.base import OrjsonBaseModel
 from services.person import PersonService, get_person_service
 
@@ -48,6 +52,20 @@ async def person_search_list(
     return persons_response
 
 
+@router.get(
+    '/export',
+    summary='Выгрузка персонажей',
+    description='Потоковая выгрузка всех персонажей в формате NDJSON',
+    response_class=StreamingResponse,
+)
+async def export_persons(
+    person_service: PersonService = Depends(get_person_service),
+    batch_size: BatchSize = settings.export_batch_size,
+    fields: Fields = None,
+) -> StreamingResponse:
+    return ndjson_response(person_service.export(batch_size, fields))
+
+
 @router.get(
     '/{person_id}/film',
     response_model=list[Film],
@@ -56,9 +74,11 @@ async def person_search_list(
 )
 async def person_film_list(
     person_id: UUID,
-    person_service: PersonService = Depends(get_person_service)
+    person_service: PersonService = Depends(get_person_service),
+    page_size: Annotated[int, Query(description="Фильмов на страницу", ge=1)] = 50,
+    page_number: Annotated[int, Query(description="Номер страницы", ge=1)] = 1,
 ):
-    films = await person_service.get_person_film_list(person_id)
+    films = await person_service.get_person_film_list(person_id, page_number, page_size)
 
     return [
         Film(uuid=film.id, title=film.title, imdb_rating=film.imdb_rating)
@@ -66,6 +86,20 @@ async def person_film_list(
     ]
 
 
+@router.post(
+    '/batch',
+    response_model=list[Person | None],
+    summary='Данные по нескольким персонажам',
+    description='Данные по списку персонажей в порядке запроса',
+)
+async def persons_batch(
+    batch: BatchRequest,
+    person_service: PersonService = Depends(get_person_service),
+):
+    persons = await person_service.get_many(batch.ids)
+    return [person_response(person) if person else None for person in persons]
+
+
 @router.get(
     '/{person_id}',
     response_model=Person,
@@ -79,6 +113,10 @@ async def person_details(person_id: UUID, person_service: PersonService = Depend
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND, detail=f"person with id {person_id} not found"
         )
+    return person_response(person)
+
+
+def person_response(person) -> Person:
     films = []
     for film in person.films:
         films.append(PersonFilm(uuid=film.id, roles=film.roles))
@@ -0,0 +1,21 @@
+"""Benchmarks for the service hot paths.
+
+Run from the `app` directory, e.g. `python -m benchmarks.response_cache`.
+Redis and Elasticsearch are replaced by in-process stand-ins fed from
+`data/*.json`, so no running infrastructure is needed.
+"""
+import os
+
+BENCHMARK_ENV = {
+    "PROJECT_NAME": "movies",
+    "ELASTIC_HOST": "localhost",
+    "ELASTIC_PORT": "9200",
+    "REDIS_HOST": "localhost",
+    "REDIS_PORT": "6379",
+    "FILM_CACHE_EXPIRE_IN_SECONDS": "300",
+    "GENRE_CACHE_EXPIRE_IN_SECONDS": "300",
+    "PERSON_CACHE_EXPIRE_IN_SECONDS": "300",
+}
+
+for name, value in BENCHMARK_ENV.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,114 @@
+"""Compare cache payload size and encode/decode cost of the cache codecs.
+
+List pages of `Film` and `FilmDetail` models are built from
+`data/movies_data.json` and round-tripped through the legacy encoding (a JSON
+array of JSON strings) and every available codec configuration.
+
+    python -m benchmarks.codec --page-size 50
+"""
+import argparse
+import json
+import time
+
+import benchmarks  # noqa: F401
+from benchmarks.fakes import load_documents
+from core.codec import COMPRESSORS, SERIALIZERS, CacheCodec
+from models.film import Film, FilmDetail
+
+
+def film_detail(source: dict) -> FilmDetail:
+    return FilmDetail(
+        id=source["id"],
+        title=source["title"],
+        imdb_rating=source.get("imdb_rating"),
+        description=source.get("description") or "",
+        genres=[],
+        actors=[{"id": p["id"], "full_name": p["name"]} for p in source["actors"]],
+        writers=[{"id": p["id"], "full_name": p["name"]} for p in source["writers"]],
+        directors=[
+            {"id": p["id"], "full_name": p["name"]} for p in source["directors"]
+        ],
+    )
+
+
+def legacy_codec(model_class):
+    def dump(models):
+        return json.dumps([model.json() for model in models])
+
+    def load(data):
+        return [model_class.parse_raw(item) for item in json.loads(data)]
+
+    return dump, load
+
+
+def codec_pair(codec: CacheCodec, model_class):
+    def dump(models):
+        return codec.dumps([model.model_dump(mode="json") for model in models])
+
+    def load(data):
+        return [model_class(**item) for item in codec.loads(data)]
+
+    return dump, load
+
+
+def available_codecs() -> dict[str, CacheCodec]:
+    codecs = {}
+    for serializer in SERIALIZERS:
+        for compression in COMPRESSORS:
+            try:
+                codecs[f"{serializer}+{compression}"] = CacheCodec(
+                    serializer, compression, compression_min_size=0
+                )
+            except ImportError:
+                continue
+    return codecs
+
+
+def run(pages: list[list], dump, load, rounds: int) -> tuple[float, float, int]:
+    encoded = [dump(page) for page in pages]
+    size = sum(len(data) for data in encoded)
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for page in pages:
+            dump(page)
+    encode = (time.perf_counter() - started) / (rounds * len(pages))
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for data in encoded:
+            load(data)
+    decode = (time.perf_counter() - started) / (rounds * len(pages))
+    return encode, decode, size // len(pages)
+
+
+def main(page_size: int, rounds: int):
+    sources = list(load_documents("movies").values())
+    datasets = {
+        "Film": (Film, [Film(**source) for source in sources]),
+        "FilmDetail": (FilmDetail, [film_detail(source) for source in sources]),
+    }
+    codecs = available_codecs()
+
+    for name, (model_class, models) in datasets.items():
+        pages = []
+        for start in range(0, len(models), page_size):
+            end = start + page_size
+            pages.append(models[start:end])
+        print(f"{name} pages of {page_size}, {len(pages)} pages")
+        print(f"  {'codec':<16}{'bytes/page':>12}{'encode us':>12}{'decode us':>12}")
+        results = {"legacy json": run(pages, *legacy_codec(model_class), rounds)}
+        for codec_name, codec in codecs.items():
+            results[codec_name] = run(pages, *codec_pair(codec, model_class), rounds)
+        for codec_name, (encode, decode, size) in results.items():
+            print(
+                f"  {codec_name:<16}{size:>12}{encode * 1e6:>12.1f}{decode * 1e6:>12.1f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    main(args.page_size, args.rounds)
@@ -0,0 +1,321 @@
+import copy
+import os
+import re
+from collections import Counter
+from functools import cmp_to_key
+from itertools import count, islice
+from typing import Any
+
+import orjson
+from core.config import BASE_DIR
+from elastic_transport import ApiResponseMeta, HttpHeaders, NodeConfig
+from elasticsearch import NotFoundError
+
+DATA_DIR = os.path.join(os.path.dirname(BASE_DIR), "data")
+INDICES = ("movies", "genres", "persons")
+TEXT_FIELDS = (
+    "title",
+    "description",
+    "name",
+    "full_name",
+    "genres",
+    "actors_names",
+    "writers_names",
+    "directors_names",
+)
+
+
+def load_documents(index: str, data_dir: str = DATA_DIR) -> dict[str, dict]:
+    documents = {}
+    with open(os.path.join(data_dir, f"{index}_data.json"), "rb") as data_file:
+        for line in data_file:
+            if line.strip():
+                document = orjson.loads(line)
+                documents[document["_id"]] = document["_source"]
+    return documents
+
+
+def _tokens(value: Any) -> set[str]:
+    return set(re.findall(r"\w+", str(value).lower()))
+
+
+def _values(source: dict, field: str) -> list:
+    current = [source]
+    for part in field.split("."):
+        found = []
+        for item in current:
+            if isinstance(item, dict) and part in item:
+                value = item[part]
+                found.extend(value if isinstance(value, list) else [value])
+        current = found
+    return current
+
+
+def _not_found() -> NotFoundError:
+    meta = ApiResponseMeta(
+        status=404,
+        http_version="1.1",
+        headers=HttpHeaders(),
+        duration=0.0,
+        node=NodeConfig("http", "localhost", 9200),
+    )
+    return NotFoundError("not_found", meta, {"found": False})
+
+
+class FakeElasticsearch:
+    """In-process stand-in for `AsyncElasticsearch` over the bundled dumps.
+
+    It implements just enough of the query DSL for the services: match_all,
+    match, multi_match, term(s), ids, bool and nested queries with `_name`,
+    sorting, from/size, search_after, point in time and `_source` filtering.
+    Like Elasticsearch, sorted searches in a point in time get an implicit
+    `_shard_doc` tiebreaker, whose value is the position of the document.
+    Every API call is counted in `calls`.
+    """
+
+    def __init__(self, data_dir: str = DATA_DIR):
+        self.indices = {index: load_documents(index, data_dir) for index in INDICES}
+        self.calls: Counter = Counter()
+        self._pits: dict[str, str] = {}
+        self._pit_ids = count()
+
+    def reset_calls(self):
+        self.calls.clear()
+
+    async def close(self):
+        pass
+
+    async def get(self, index: str, id, **kwargs) -> dict:
+        self.calls["get"] += 1
+        source = self.indices[index].get(str(id))
+        if source is None:
+            raise _not_found()
+        return {
+            "_index": index,
+            "_id": str(id),
+            "found": True,
+            "_source": self._project(source, kwargs),
+        }
+
+    async def mget(self, index: str, ids: list, **kwargs) -> dict:
+        self.calls["mget"] += 1
+        docs = []
+        for doc_id in ids:
+            source = self.indices[index].get(str(doc_id))
+            doc = {"_index": index, "_id": str(doc_id), "found": source is not None}
+            if source is not None:
+                doc["_source"] = self._project(source, kwargs)
+            docs.append(doc)
+        return {"docs": docs}
+
+    async def open_point_in_time(self, index: str, keep_alive: str, **kwargs) -> dict:
+        self.calls["open_point_in_time"] += 1
+        pit_id = f"pit-{next(self._pit_ids)}"
+        self._pits[pit_id] = index
+        return {"id": pit_id}
+
+    async def close_point_in_time(self, id: str | None = None, **kwargs) -> dict:
+        self.calls["close_point_in_time"] += 1
+        freed = self._pits.pop(id, None) is not None
+        return {"succeeded": True, "num_freed": int(freed)}
+
+    async def search(self, **kwargs) -> dict:
+        self.calls["search"] += 1
+        return self._search(**kwargs)
+
+    async def msearch(self, searches: list, index: str | None = None, **kwargs) -> dict:
+        self.calls["msearch"] += 1
+        return {
+            "responses": [
+                self._search(index=header.get("index", index), body=body)
+                for header, body in zip(searches[::2], searches[1::2])
+            ]
+        }
+
+    def _search(
+        self,
+        index=None,
+        body=None,
+        query=None,
+        from_=0,
+        size=10,
+        sort=None,
+        search_after=None,
+        pit=None,
+        **kwargs,
+    ) -> dict:
+        if body:
+            query = body.get("query", query)
+            from_ = body.get("from", from_)
+            size = body.get("size", size)
+            sort = body.get("sort", sort)
+            search_after = body.get("search_after", search_after)
+            pit = body.get("pit", pit)
+            kwargs.setdefault("source", body.get("_source"))
+        if pit:
+            if pit["id"] not in self._pits:
+                raise _not_found()
+            index = self._pits[pit["id"]]
+        if isinstance(index, (list, tuple)):
+            index = index[0]
+
+        hits = []
+        for position, (doc_id, source) in enumerate(self.indices[index].items()):
+            named = []
+            if self._matches(source, query, named):
+                hits.append((doc_id, source, named, position))
+
+        sort_fields = self._sort_fields(sort)
+        if pit and sort_fields and "_shard_doc" not in dict(sort_fields):
+            sort_fields.append(("_shard_doc", "asc"))
+        order_key = cmp_to_key(
+            lambda left, right: self._compare(
+                self._sort_values(left, sort_fields),
+                self._sort_values(right, sort_fields),
+                sort_fields,
+            )
+        )
+        hits.sort(key=order_key)
+        if search_after is not None:
+            hits = [
+                hit
+                for hit in hits
+                if self._compare(
+                    self._sort_values(hit, sort_fields), search_after, sort_fields
+                )
+                > 0
+            ]
+
+        result_hits = []
+        for hit_tuple in islice(hits, from_, from_ + size):
+            doc_id, source, named, _ = hit_tuple
+            hit = {"_index": index, "_id": doc_id, "_score": 1.0}
+            hit["_source"] = self._project(source, kwargs)
+            if named:
+                hit["matched_queries"] = list(dict.fromkeys(named))
+            if sort_fields:
+                hit["sort"] = self._sort_values(hit_tuple, sort_fields)
+            result_hits.append(hit)
+
+        response = {
+            "hits": {
+                "total": {"value": len(hits), "relation": "eq"},
+                "hits": result_hits,
+            }
+        }
+        if pit:
+            response["pit_id"] = pit["id"]
+        return response
+
+    def _matches(self, source: dict, query: dict | None, named: list) -> bool:
+        if not query or "match_all" in query:
+            return True
+        if "multi_match" in query:
+            tokens = _tokens(query["multi_match"]["query"])
+            fields = query["multi_match"].get("fields") or TEXT_FIELDS
+            return any(
+                tokens
+                & _tokens(" ".join(map(str, _values(source, field.split("^")[0]))))
+                for field in fields
+            )
+        if "match" in query:
+            ((field, value),) = query["match"].items()
+            if isinstance(value, dict):
+                value = value["query"]
+            return bool(
+                _tokens(value) & _tokens(" ".join(map(str, _values(source, field))))
+            )
+        if "term" in query:
+            ((field, value),) = query["term"].items()
+            if isinstance(value, dict):
+                value = value["value"]
+            return str(value) in {str(item) for item in _values(source, field)}
+        if "terms" in query:
+            ((field, values),) = [
+                (key, value) for key, value in query["terms"].items() if key != "_name"
+            ]
+            wanted = {str(value) for value in values}
+            return bool(wanted & {str(item) for item in _values(source, field)})
+        if "ids" in query:
+            return source.get("id") in query["ids"]["values"]
+        if "nested" in query:
+            matched = self._matches(source, query["nested"]["query"], named)
+            if matched and "_name" in query["nested"]:
+                named.append(query["nested"]["_name"])
+            return matched
+        if "bool" in query:
+            clauses = query["bool"]
+            required = clauses.get("must", []) + clauses.get("filter", [])
+            if not all(self._matches(source, clause, named) for clause in required):
+                return False
+            should = clauses.get("should", [])
+            if should:
+                matched = [self._matches(source, clause, named) for clause in should]
+                if not any(matched) and (
+                    not required or clauses.get("minimum_should_match")
+                ):
+                    return False
+            return True
+        raise NotImplementedError(f"Unsupported query {query}")
+
+    @staticmethod
+    def _sort_fields(sort) -> list[tuple[str, str]]:
+        fields = []
+        for item in sort or []:
+            if isinstance(item, str):
+                fields.append((item, "asc"))
+                continue
+            ((field, order),) = item.items()
+            fields.append((field, order["order"] if isinstance(order, dict) else order))
+        return fields
+
+    @staticmethod
+    def _sort_values(hit: tuple, sort_fields: list) -> list:
+        return [
+            hit[3] if field in ("_doc", "_shard_doc") else hit[1].get(field)
+            for field, _ in sort_fields
+        ]
+
+    @staticmethod
+    def _compare(values: list, others: list, sort_fields: list) -> int:
+        """Compare sort values like Elasticsearch, missing values sort last."""
+        for (_, order), value, other in zip(sort_fields, values, others):
+            if value == other:
+                continue
+            if value is None:
+                return 1
+            if other is None:
+                return -1
+            result = -1 if value < other else 1
+            return result if order == "asc" else -result
+        return 0
+
+    @staticmethod
+    def _project(source: dict, kwargs: dict) -> dict:
+        includes = kwargs.get("source_includes")
+        if includes is None:
+            includes = kwargs.get("source")
+        if includes is None:
+            includes = kwargs.get("_source")
+        if includes is None or includes is True:
+            return copy.deepcopy(source)
+        if includes is False:
+            return {}
+        if isinstance(includes, dict):
+            includes = includes.get("includes") or list(source)
+        if isinstance(includes, str):
+            includes = [includes]
+
+        projected = {}
+        for field in includes:
+            top, _, nested = field.partition(".")
+            if top not in source:
+                continue
+            if nested and isinstance(source[top], list):
+                items = projected.setdefault(top, [{} for _ in source[top]])
+                for item, original in zip(items, source[top]):
+                    if isinstance(original, dict) and nested in original:
+                        item[nested] = original[nested]
+            else:
+                projected[top] = copy.deepcopy(source[top])
+        return projected
@@ -0,0 +1,271 @@
+"""Drive the API with a concurrent, Zipf-distributed mix of requests.
+
+By default the app runs in-process behind the ASGI transport on fakeredis and
+the in-process Elasticsearch, with the cache settings taken from the
+environment. With `--url` a running deployment is loaded over HTTP instead;
+cache hits and Elasticsearch calls are then not observable and not reported.
+
+Ids and queries come from `data/*.json`, their popularity follows a Zipf law,
+so a few films, persons and words get most of the traffic.
+
+    python -m benchmarks.loadgen --duration 30 --concurrency 50
+    python -m benchmarks.loadgen --mix film_detail=5 film_search=1 --zipf 1.2
+    python -m benchmarks.loadgen --url http://localhost --requests 10000
+"""
+import argparse
+import asyncio
+import bisect
+import itertools
+import logging
+import random
+import re
+import statistics
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable
+
+import benchmarks  # noqa: F401
+import httpx
+from benchmarks.fakes import FakeElasticsearch, load_documents
+
+DEFAULT_MIX = {
+    "film_list": 15,
+    "film_search": 15,
+    "film_detail": 30,
+    "person_detail": 10,
+    "person_films": 5,
+    "person_search": 5,
+    "genre_list": 10,
+    "genre_detail": 10,
+}
+
+# Endpoint name and ES call count of the request being served.
+request_var: ContextVar[tuple[str, list[int]]] = ContextVar("request")
+
+
+@dataclass
+class EndpointStats:
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+    es_calls: int = 0
+    es_free: int = 0
+
+
+class Zipf:
+    """Sample items with probability proportional to 1 / rank ** s."""
+
+    def __init__(self, items: list, s: float, rng: random.Random):
+        self.items = list(items)
+        rng.shuffle(self.items)
+        weights = (1 / rank**s for rank in range(1, len(self.items) + 1))
+        self.cum_weights = list(itertools.accumulate(weights))
+        self.rng = rng
+
+    def __call__(self):
+        point = self.rng.random() * self.cum_weights[-1]
+        return self.items[bisect.bisect(self.cum_weights, point)]
+
+
+class CountingElasticsearch:
+    """Attribute Elasticsearch calls to the endpoint of the current request."""
+
+    def __init__(self, elastic: FakeElasticsearch, stats: dict[str, EndpointStats]):
+        self._elastic = elastic
+        self._stats = stats
+
+    def __getattr__(self, name: str):
+        method = getattr(self._elastic, name)
+        if not callable(method):
+            return method
+
+        async def call(*args, **kwargs):
+            request = request_var.get(None)
+            if request is not None:
+                endpoint, es_calls = request
+                self._stats[endpoint].es_calls += 1
+                es_calls[0] += 1
+            return await method(*args, **kwargs)
+
+        return call
+
+
+def words(texts, min_length: int = 4) -> list[str]:
+    found = set()
+    for text in texts:
+        found.update(re.findall(rf"\w{{{min_length},}}", text.lower()))
+    return sorted(found)
+
+
+def build_endpoints(s: float, rng: random.Random) -> dict[str, Callable[[], str]]:
+    movies = load_documents("movies")
+    persons = load_documents("persons")
+    genres = load_documents("genres")
+    film_id = Zipf(list(movies), s, rng)
+    person_id = Zipf(list(persons), s, rng)
+    genre_id = Zipf(list(genres), s, rng)
+    page = Zipf(list(range(1, 11)), s, rng)
+    title_word = Zipf(words(movie["title"] for movie in movies.values()), s, rng)
+    name_word = Zipf(words(person["full_name"] for person in persons.values()), s, rng)
+    sort = Zipf(["-imdb_rating", "imdb_rating", None], s, rng)
+
+    def film_list() -> str:
+        path = f"/api/v1/films/?page_number={page()}"
+        if order := sort():
+            path += f"&sort={order}"
+        if rng.random() < 0.3:
+            path += f"&genre={genre_id()}"
+        return path
+
+    return {
+        "film_list": film_list,
+        "film_search": lambda: f"/api/v1/films/search?query={title_word()}",
+        "film_detail": lambda: f"/api/v1/films/{film_id()}",
+        "person_detail": lambda: f"/api/v1/persons/{person_id()}",
+        "person_films": lambda: f"/api/v1/persons/{person_id()}/film",
+        "person_search": lambda: f"/api/v1/persons/search?query={name_word()}",
+        "genre_list": lambda: "/api/v1/genres",
+        "genre_detail": lambda: f"/api/v1/genres/{genre_id()}",
+    }
+
+
+async def worker(
+    client: httpx.AsyncClient,
+    endpoints: dict[str, Callable[[], str]],
+    mix: dict[str, int],
+    stats: dict[str, EndpointStats],
+    rng: random.Random,
+    budget: Callable[[], bool],
+):
+    names, weights = list(mix), list(mix.values())
+    while budget():
+        name = rng.choices(names, weights)[0]
+        endpoint = stats[name]
+        es_calls = [0]
+        token = request_var.set((name, es_calls))
+        started = time.perf_counter()
+        try:
+            response = await client.get(endpoints[name]())
+            if response.status_code >= 500:
+                endpoint.errors += 1
+        except httpx.HTTPError:
+            endpoint.errors += 1
+        endpoint.latencies.append(time.perf_counter() - started)
+        if not es_calls[0]:
+            endpoint.es_free += 1
+        request_var.reset(token)
+
+
+def percentile(values: list[float], share: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def report(stats: dict[str, EndpointStats], elapsed: float, in_process: bool):
+    print(
+        f"{'endpoint':<15}{'requests':>9}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}"
+        f"{'p99 ms':>9}{'hit %':>8}{'ES/req':>8}{'errors':>8}"
+    )
+    total = EndpointStats()
+    for name, endpoint in [*stats.items(), ("total", total)]:
+        if name != "total":
+            total.latencies += endpoint.latencies
+            total.errors += endpoint.errors
+            total.es_calls += endpoint.es_calls
+            total.es_free += endpoint.es_free
+        requests = len(endpoint.latencies)
+        if not requests:
+            continue
+        latencies = sorted(endpoint.latencies)
+        hit_ratio = es_per_request = "-"
+        if in_process:
+            # A request answered without reaching Elasticsearch is a cache hit.
+            hit_ratio = f"{endpoint.es_free / requests * 100:.1f}"
+            es_per_request = f"{endpoint.es_calls / requests:.2f}"
+        print(
+            f"{name:<15}{requests:>9}{requests / elapsed:>9.1f}"
+            f"{statistics.median(latencies) * 1e3:>9.2f}"
+            f"{percentile(latencies, 0.95) * 1e3:>9.2f}"
+            f"{percentile(latencies, 0.99) * 1e3:>9.2f}"
+            f"{hit_ratio:>8}{es_per_request:>8}{endpoint.errors:>8}"
+        )
+
+
+async def main(args: argparse.Namespace):
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    logging.getLogger("services").setLevel(logging.WARNING)
+    rng = random.Random(args.seed)
+    endpoints = build_endpoints(args.zipf, rng)
+    stats = defaultdict(EndpointStats)
+    in_process = args.url is None
+
+    if in_process:
+        import fakeredis
+        from db import elastic, redis
+        from main import app
+        from services.genre_catalog import genre_catalog
+
+        redis.redis = fakeredis.FakeAsyncRedis()
+        elastic.es = CountingElasticsearch(FakeElasticsearch(), stats)
+        await genre_catalog.refresh(elastic.es, redis.redis)
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://loadgen"
+        )
+    else:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+
+    started = time.perf_counter()
+    if args.requests:
+        remaining = itertools.count(args.requests, -1)
+
+        def budget() -> bool:
+            return next(remaining) > 0
+
+    else:
+
+        def budget() -> bool:
+            return time.perf_counter() - started < args.duration
+
+    async with client:
+        await asyncio.gather(
+            *(
+                worker(client, endpoints, args.mix, stats, rng, budget)
+                for _ in range(args.concurrency)
+            )
+        )
+    report(stats, time.perf_counter() - started, in_process)
+
+
+def parse_mix(items: list[str]) -> dict[str, int]:
+    mix = {}
+    for item in items:
+        name, _, weight = item.partition("=")
+        if name not in DEFAULT_MIX or not weight.isdigit():
+            raise argparse.ArgumentTypeError(f"invalid mix entry {item}")
+        mix[name] = int(weight)
+    return mix
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--url", help="load a running deployment over HTTP")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--requests", type=int, help="stop after this many requests")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument(
+        "--mix",
+        nargs="+",
+        metavar="ENDPOINT=WEIGHT",
+        help=f"endpoint weights, of {', '.join(DEFAULT_MIX)}",
+    )
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=10.0)
+    args = parser.parse_args()
+    try:
+        args.mix = parse_mix(args.mix) if args.mix else DEFAULT_MIX
+    except argparse.ArgumentTypeError as error:
+        parser.error(str(error))
+    asyncio.run(main(args))
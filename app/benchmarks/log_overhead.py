@@ -0,0 +1,113 @@
+"""Measure what logging costs the list endpoints on the event loop.
+
+The debug lines of a film list and a person search page used to format the
+whole Elasticsearch response with an f-string, even with DEBUG disabled.
+They are compared with the lazy `%s` form. Emitted records are compared
+between a `StreamHandler` writing to a slow stream (a lagging stdout consumer)
+and the `DeferredQueueHandler` that hands them to a background thread.
+
+    python -m benchmarks.log_overhead --page-size 50 --write-delay 0.0002
+"""
+import argparse
+import asyncio
+import io
+import logging
+import queue
+import time
+from logging.handlers import QueueListener
+
+import benchmarks  # noqa: F401
+from benchmarks.fakes import FakeElasticsearch
+from core.logger import LOG_FORMAT, DeferredQueueHandler
+
+
+class SlowStream(io.StringIO):
+    """Stream whose writes block for a while, like a full pipe to stdout."""
+
+    def __init__(self, delay: float):
+        super().__init__()
+        self.delay = delay
+
+    def write(self, text: str) -> int:
+        time.sleep(self.delay)
+        return len(text)
+
+
+def bench_logger(handler: logging.Handler | None) -> logging.Logger:
+    logger = logging.getLogger("benchmarks.log_overhead")
+    logger.handlers.clear()
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    if handler is not None:
+        logger.addHandler(handler)
+    return logger
+
+
+def per_call(call, rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        call()
+    return (time.perf_counter() - started) / rounds
+
+
+async def list_responses(page_size: int) -> tuple[dict, dict]:
+    elastic = FakeElasticsearch()
+    films = await elastic.search(
+        index="movies",
+        body={"size": page_size, "sort": [{"imdb_rating": {"order": "desc"}}]},
+    )
+    persons = await elastic.search(index="persons", body={"size": page_size})
+    return films, persons
+
+
+def main(args: argparse.Namespace):
+    films, persons = asyncio.run(list_responses(args.page_size))
+    logger = bench_logger(logging.NullHandler())
+
+    def eager():
+        logger.debug(f"Retrieved films {films}")
+        logger.debug(f"Search person {persons}")
+
+    def lazy():
+        logger.debug("Retrieved films %s", films)
+        logger.debug("Search person %s", persons)
+
+    print(f"Debug lines of one list page ({args.page_size} hits), DEBUG disabled")
+    before = per_call(eager, args.rounds)
+    after = per_call(lazy, args.rounds)
+    print(f"{'f-string':<24}{before * 1e6:>12.1f} us/request")
+    print(f"{'lazy %s':<24}{after * 1e6:>12.1f} us/request")
+    print(f"{'removed':<24}{(before - after) * 1e6:>12.1f} us/request")
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    stream_handler = logging.StreamHandler(SlowStream(args.write_delay))
+    stream_handler.setFormatter(formatter)
+    logger = bench_logger(stream_handler)
+    records = args.rounds // 10
+
+    def emit():
+        logger.info("Film with ID %s not found in Elasticsearch", "a1b2c3")
+
+    print(f"\nOne INFO record, stream writes block for {args.write_delay * 1e3} ms")
+    blocking = per_call(emit, records)
+
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, stream_handler)
+    logger = bench_logger(DeferredQueueHandler(log_queue))
+    listener.start()
+    queued = per_call(emit, records)
+    listener.stop()
+    print(f"{'StreamHandler':<24}{blocking * 1e6:>12.1f} us on the event loop")
+    print(f"{'QueueHandler':<24}{queued * 1e6:>12.1f} us on the event loop")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=2000)
+    parser.add_argument(
+        "--write-delay", type=float, default=0.0002, help="seconds per stream write"
+    )
+    main(parser.parse_args())
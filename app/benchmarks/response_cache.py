@@ -0,0 +1,79 @@
+"""Compare cache-hit latency of the model path with the response byte cache.
+
+    python -m benchmarks.response_cache --requests 2000
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import time
+
+os.environ["RESPONSE_CACHE_ENABLED"] = "false"
+
+import benchmarks  # noqa: E402,F401
+import fakeredis  # noqa: E402
+import httpx  # noqa: E402
+from benchmarks.fakes import FakeElasticsearch  # noqa: E402
+from core.config import settings  # noqa: E402
+from core.response_cache import ResponseCacheMiddleware  # noqa: E402
+from db import elastic, redis  # noqa: E402
+from main import app  # noqa: E402
+
+ROUTES = (
+    "/api/v1/films/?sort=-imdb_rating&page_size=50",
+    "/api/v1/films/3d825f60-9fff-4dfe-b294-1a45fa1e115d",
+    "/api/v1/genres?page_size=50",
+    "/api/v1/persons/search?query=George&page_size=50",
+)
+
+
+async def measure(asgi_app, route: str, requests: int) -> list[float]:
+    transport = httpx.ASGITransport(app=asgi_app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        response = await client.get(route)
+        response.raise_for_status()
+        timings = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            await client.get(route)
+            timings.append(time.perf_counter() - started)
+    return timings
+
+
+def summary(timings: list[float]) -> str:
+    timings = sorted(timings)
+    p50 = statistics.median(timings) * 1e6
+    p99 = timings[int(len(timings) * 0.99) - 1] * 1e6
+    return f"p50 {p50:8.1f} us  p99 {p99:8.1f} us"
+
+
+async def main(requests: int):
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    redis.redis = fakeredis.FakeAsyncRedis()
+    elastic.es = FakeElasticsearch()
+    cached_app = ResponseCacheMiddleware(
+        app,
+        expire_by_prefix={
+            "/api/v1/films": settings.film_cache_expire_in_seconds,
+            "/api/v1/genres": settings.genre_cache_expire_in_seconds,
+            "/api/v1/persons": settings.person_cache_expire_in_seconds,
+        },
+    )
+
+    for route in ROUTES:
+        model_path = await measure(app, route, requests)
+        byte_path = await measure(cached_app, route, requests)
+        speedup = statistics.median(model_path) / statistics.median(byte_path)
+        print(route)
+        print(f"  service cache hit   {summary(model_path)}")
+        print(f"  response cache hit  {summary(byte_path)}  x{speedup:.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests))
@@ -0,0 +1,257 @@
+"""Microbenchmarks of the service hot paths with a regression check.
+
+Every case runs a service method or a router on fakeredis and the in-process
+Elasticsearch and reports ops/sec, peak allocated KiB and Elasticsearch calls
+per operation. Cache miss cases start every operation on an empty Redis and
+run fewer operations, the fake Elasticsearch scans whole indices.
+
+    python -m benchmarks.suite                       # print the results
+    python -m benchmarks.suite --save                # store them as the baseline
+    python -m benchmarks.suite --compare             # exit 1 on a regression
+    python -m benchmarks.suite --compare --same-host # also compare ops/sec
+    python -m benchmarks.suite --cases film_detail_hit film_detail_miss
+"""
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Awaitable, Callable
+
+os.environ["RESPONSE_CACHE_ENABLED"] = "false"
+os.environ["HTTP_CACHE_ENABLED"] = "false"
+# Early refreshes would add background ES calls to the cache hit cases.
+os.environ["CACHE_REFRESH_AHEAD_BETA"] = "0"
+
+import benchmarks  # noqa: E402,F401
+import fakeredis  # noqa: E402
+import httpx  # noqa: E402
+from benchmarks.fakes import FakeElasticsearch, load_documents  # noqa: E402
+from core.codec import dump_model, load_model  # noqa: E402
+from core.metrics import counters  # noqa: E402
+from db import elastic, redis  # noqa: E402
+from main import app  # noqa: E402
+from models.film import FilmDetail  # noqa: E402
+from services.film import FilmService  # noqa: E402
+from services.genre import GenreService  # noqa: E402
+from services.genre_catalog import genre_catalog  # noqa: E402
+from services.person import PersonService  # noqa: E402
+
+BASELINE = Path(__file__).with_name("baseline.json")
+MIN_ROUND_TIME = 0.2
+
+
+@dataclass
+class Result:
+    ops_per_sec: float
+    kib_per_op: float
+    es_calls_per_op: float
+
+
+@dataclass
+class Case:
+    op: Callable[[], Awaitable]
+    cold: bool = False
+
+
+class Suite:
+    def __init__(self):
+        self.redis = fakeredis.FakeAsyncRedis()
+        self.es = FakeElasticsearch()
+        redis.redis, elastic.es = self.redis, self.es
+        self.films = FilmService(self.redis, self.es)
+        self.genres = GenreService(self.redis, self.es)
+        self.persons = PersonService(self.redis, self.es)
+        self.client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://bench"
+        )
+
+        film_ids = list(load_documents("movies"))
+        person_ids = list(load_documents("persons"))
+        self.film_id, self.person_id = film_ids[0], person_ids[0]
+        self.film_ids, self.person_ids = film_ids[:30], person_ids[:30]
+        self.film_detail = FilmDetail(
+            id=self.film_id,
+            title="Star Wars",
+            imdb_rating=8.6,
+            description="A long time ago in a galaxy far, far away",
+            genres=[],
+            actors=[
+                {"id": person_id, "full_name": "Actor"} for person_id in person_ids[:20]
+            ],
+            writers=[],
+            directors=[],
+        )
+        self.film_payload = dump_model(self.film_detail)
+
+    def cases(self) -> dict[str, Case]:
+        films, persons, genres = self.films, self.persons, self.genres
+        service_cases = {
+            "film_detail": lambda: films.get_by_id(self.film_id),
+            "film_list": lambda: films.get_list(["-imdb_rating"], None, 50, 1),
+            "film_search": lambda: films.search_film("star wars", 50, 1),
+            "film_batch": lambda: films.get_many(self.film_ids),
+            "person_detail": lambda: persons.get_by_id(self.person_id),
+            "person_films": lambda: persons.get_person_film_list(self.person_id, 1, 50),
+            "person_search": lambda: persons.get_search_list("george", 1, 50),
+            "person_batch": lambda: persons.get_many(self.person_ids),
+        }
+        cases = {}
+        for name, op in service_cases.items():
+            cases[f"{name}_hit"] = Case(op)
+            cases[f"{name}_miss"] = Case(op, cold=True)
+        cases.update(
+            genre_list=Case(lambda: genres.get_list(1, 50)),
+            router_film_detail_hit=Case(
+                lambda: self.client.get(f"/api/v1/films/{self.film_id}")
+            ),
+            router_film_list_hit=Case(
+                lambda: self.client.get("/api/v1/films/?sort=-imdb_rating")
+            ),
+            film_detail_dump=Case(self._dump),
+            film_detail_load=Case(self._load),
+        )
+        return cases
+
+    async def _dump(self):
+        return dump_model(self.film_detail)
+
+    async def _load(self):
+        return load_model(FilmDetail)(self.film_payload)
+
+    async def run(self, case: Case, ops: int) -> Result:
+        await genre_catalog.refresh(self.es, self.redis)
+        await self.redis.flushdb()
+        await case.op()
+
+        # The fastest of several rounds is the least disturbed by the machine,
+        # garbage collection is paused while timing like in timeit.
+        rounds = 1 if case.cold else 5
+        best = 0.0
+        gc.disable()
+        try:
+            for _ in range(rounds):
+                self.es.reset_calls()
+                done, elapsed = 0, 0.0
+                while done < ops or (not case.cold and elapsed < MIN_ROUND_TIME):
+                    if case.cold:
+                        await self.redis.flushdb()
+                    started = time.perf_counter()
+                    await case.op()
+                    elapsed += time.perf_counter() - started
+                    done += 1
+                best = max(best, done / elapsed)
+        finally:
+            gc.enable()
+        es_calls = sum(self.es.calls.values())
+
+        # Allocations are measured in a separate pass, tracing slows it down.
+        peak = 0
+        tracemalloc.start()
+        for _ in range(min(ops, 5 if case.cold else 50)):
+            if case.cold:
+                await self.redis.flushdb()
+            tracemalloc.reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+            await case.op()
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - current)
+        tracemalloc.stop()
+        # Let background cache refreshes finish before the next case.
+        await asyncio.sleep(0)
+
+        return Result(
+            ops_per_sec=round(best, 1),
+            kib_per_op=round(peak / 1024, 1),
+            es_calls_per_op=round(es_calls / done, 2),
+        )
+
+
+def regressions(
+    results: dict[str, Result],
+    baseline: dict[str, dict],
+    threshold: float,
+    same_host: bool = False,
+) -> list[str]:
+    """Compare the results with the baseline.
+
+    Allocations and Elasticsearch calls do not depend on the machine, ops/sec
+    is only compared when the baseline was saved on the same host.
+    """
+    found = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        base = Result(**baseline[name])
+        if same_host and result.ops_per_sec < base.ops_per_sec * (1 - threshold):
+            found.append(f"{name}: {base.ops_per_sec} -> {result.ops_per_sec} ops/sec")
+        if result.kib_per_op > base.kib_per_op * (1 + threshold) + 1:
+            found.append(f"{name}: {base.kib_per_op} -> {result.kib_per_op} KiB/op")
+        if result.es_calls_per_op > base.es_calls_per_op:
+            found.append(
+                f"{name}: {base.es_calls_per_op} -> {result.es_calls_per_op} ES calls/op"
+            )
+    return found
+
+
+async def main(args: argparse.Namespace) -> int:
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    logging.getLogger("services").setLevel(logging.WARNING)
+    suite = Suite()
+    cases = suite.cases()
+    names = args.cases or list(cases)
+
+    print(f"{'case':<28}{'ops/sec':>12}{'KiB/op':>10}{'ES calls/op':>14}")
+    results = {}
+    for name in names:
+        case = cases[name]
+        ops = args.miss_ops if case.cold else args.ops
+        result = results[name] = await suite.run(case, ops)
+        print(
+            f"{name:<28}{result.ops_per_sec:>12}{result.kib_per_op:>10}"
+            f"{result.es_calls_per_op:>14}"
+        )
+    await suite.client.aclose()
+    counters.clear()
+
+    if args.save:
+        baseline = json.loads(BASELINE.read_text()) if BASELINE.exists() else {}
+        baseline.update({name: asdict(result) for name, result in results.items()})
+        BASELINE.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+        print(f"Baseline saved to {BASELINE}")
+    if args.compare:
+        found = regressions(
+            results, json.loads(BASELINE.read_text()), args.threshold, args.same_host
+        )
+        for regression in found:
+            print(f"REGRESSION {regression}")
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--ops", type=int, default=200)
+    parser.add_argument("--miss-ops", type=int, default=10)
+    parser.add_argument("--cases", nargs="*")
+    parser.add_argument("--save", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument(
+        "--same-host",
+        action="store_true",
+        help="also compare ops/sec, for a baseline saved on this machine",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.3,
+        help="allowed relative slowdown or allocation growth",
+    )
+    sys.exit(asyncio.run(main(parser.parse_args())))
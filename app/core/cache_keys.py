@@ -0,0 +1,101 @@
+"""Cache key layout shared by all services.
+
+    v<format>:<namespace>:<generation>:<kind>:<id or hash of the parameters>
+
+The generation part combines counters stored in Redis: a global one, one per
+namespace and, for list-like keys, one for the namespace's lists. Bumping a
+counter makes every dependent key unreachable at once, without SCAN or DEL;
+the orphaned entries expire on their TTL.
+"""
+import hashlib
+import time
+
+from core.config import settings
+from redis.asyncio import Redis
+
+# Bump when the layout of stored values changes.
+CACHE_FORMAT_VERSION = 3
+NAMESPACES = ("film", "genre", "person")
+GENERATION_KEY = "cache:generation"
+
+
+def generation_key(namespace: str | None = None, lists: bool = False) -> str:
+    key = GENERATION_KEY
+    if namespace:
+        key = f"{key}:{namespace}"
+    if lists:
+        key = f"{key}:lists"
+    return key
+
+
+GENERATION_KEYS = [generation_key()]
+GENERATION_KEYS += [generation_key(namespace) for namespace in NAMESPACES]
+GENERATION_KEYS += [generation_key(namespace, lists=True) for namespace in NAMESPACES]
+
+
+class Generations:
+    """Per-process copy of the generation counters.
+
+    Counters are re-read with one MGET at most every
+    `cache_generation_refresh_interval_in_seconds`, which bounds how long
+    other workers keep serving a bumped generation.
+    """
+
+    def __init__(self):
+        self._values: dict[str, int] = {}
+        self._expires_at = 0.0
+
+    async def get(self, redis: Redis) -> dict[str, int]:
+        if time.monotonic() >= self._expires_at:
+            values = await redis.mget(GENERATION_KEYS)
+            self._values = {
+                key: int(value or 0) for key, value in zip(GENERATION_KEYS, values)
+            }
+            self._expires_at = (
+                time.monotonic() + settings.cache_generation_refresh_interval_in_seconds
+            )
+        return self._values
+
+    def forget(self):
+        self._expires_at = 0.0
+
+
+generations = Generations()
+
+
+async def bump_generation(
+    redis: Redis, namespace: str | None = None, lists: bool = False
+) -> int:
+    """Invalidate all keys of a namespace (or of every namespace) in O(1)."""
+    generation = await redis.incr(generation_key(namespace, lists))
+    generations.forget()
+    return generation
+
+
+class CacheKeyBuilder:
+    def __init__(self, redis: Redis, namespace: str):
+        self.redis = redis
+        self.namespace = namespace
+
+    async def _prefix(self, lists: bool) -> str:
+        values = await generations.get(self.redis)
+        generation = (
+            f"{values[generation_key()]}.{values[generation_key(self.namespace)]}"
+        )
+        if lists:
+            generation += f".{values[generation_key(self.namespace, lists=True)]}"
+        return f"v{CACHE_FORMAT_VERSION}:{self.namespace}:{generation}"
+
+    async def detail(self, entity_id) -> str:
+        return f"{await self._prefix(lists=False)}:detail:{entity_id}"
+
+    async def list(self, kind: str, *params) -> str:
+        """Key of a page depending on many entities, e.g. a list or a search."""
+        digest = hashlib.md5(":".join(map(str, params)).encode()).hexdigest()
+        return f"{await self._prefix(lists=True)}:{kind}:{digest}"
+
+
+async def response_generation(redis: Redis) -> str:
+    """Generation of the response cache, which depends on every namespace."""
+    values = await generations.get(redis)
+    return ".".join(str(values[key]) for key in GENERATION_KEYS)
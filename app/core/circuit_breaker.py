@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable
+
+from core.config import settings
+from core.metrics import counters
+from elasticsearch import ApiError, TransportError
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpen(Exception):
+    """The backend is considered down and is not called."""
+
+
+def is_elastic_failure(error: Exception) -> bool:
+    """Whether an error means Elasticsearch is unavailable, not a bad request."""
+    if isinstance(error, ApiError):
+        return error.status_code >= 500 or error.status_code == 429
+    return isinstance(error, (TransportError, asyncio.TimeoutError))
+
+
+class CircuitBreaker:
+    """Stop calling a failing backend and probe it again after a pause.
+
+    Outcomes of the calls made in the last `window` seconds are kept, a call
+    fails when it raises an error `is_failure` accepts. Errors caused by the
+    request itself count as successful calls. Once at least `min_calls` were
+    made and the share of failed or slow ones reaches
+    `failure_ratio`, the breaker opens and rejects calls for `open_for`
+    seconds. Then a single trial call is let through: its success closes the
+    breaker, its failure opens it again.
+
+    Calls made while another call of the same breaker is in progress, e.g. a
+    fetch reading a related cache entry, are part of that call and go
+    through without being checked or recorded on their own.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: float,
+        min_calls: int,
+        failure_ratio: float,
+        slow_call_duration: float,
+        open_for: float,
+        is_failure: Callable[[Exception], bool],
+    ):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.slow_call_duration = slow_call_duration
+        self.open_for = open_for
+        self.is_failure = is_failure
+        self._outcomes: deque[tuple[float, bool]] = deque()
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._trial = False
+        self._inside_call: ContextVar[bool] = ContextVar(
+            f"inside_{name}_call", default=False
+        )
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self._trial or time.monotonic() - self._opened_at >= self.open_for:
+            return "half_open"
+        return "open"
+
+    async def call(self, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        if self._inside_call.get():
+            return await fetch()
+        trial = self._acquire()
+        token = self._inside_call.set(True)
+        started = time.monotonic()
+        ok = None
+        try:
+            result = await fetch()
+        except Exception as error:
+            if self.is_failure(error):
+                ok = False
+            else:
+                ok = time.monotonic() - started < self.slow_call_duration
+            raise
+        else:
+            ok = time.monotonic() - started < self.slow_call_duration
+            return result
+        finally:
+            self._inside_call.reset(token)
+            self._record(ok, trial)
+
+    def _acquire(self) -> bool:
+        """Return whether the call is the trial one, raise when it is rejected."""
+        if self._opened_at is None:
+            return False
+        if self._trial or time.monotonic() - self._opened_at < self.open_for:
+            counters.inc("circuit_breaker_rejected_total", breaker=self.name)
+            raise CircuitOpen(self.name)
+        self._trial = True
+        return True
+
+    def _record(self, ok: bool | None, trial: bool):
+        """Record a call outcome, `None` for a cancelled call which tells nothing."""
+        if trial:
+            self._trial = False
+            if ok is None:
+                return
+            if ok:
+                self._close()
+            else:
+                self._open()
+            return
+        if ok is None or self._opened_at is not None:
+            # Cancelled, or started before the breaker opened.
+            return
+
+        now = time.monotonic()
+        self._outcomes.append((now, ok))
+        self._failures += not ok
+        while self._outcomes[0][0] < now - self.window:
+            _, expired_ok = self._outcomes.popleft()
+            self._failures -= not expired_ok
+        calls = len(self._outcomes)
+        if calls >= self.min_calls and self._failures / calls >= self.failure_ratio:
+            self._open()
+
+    def _open(self):
+        logger.warning("Circuit breaker %s opened", self.name)
+        counters.inc("circuit_breaker_opened_total", breaker=self.name)
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self._failures = 0
+
+    def _close(self):
+        logger.warning("Circuit breaker %s closed", self.name)
+        counters.inc("circuit_breaker_closed_total", breaker=self.name)
+        self._opened_at = None
+
+
+elastic_breaker = CircuitBreaker(
+    "elasticsearch",
+    window=settings.circuit_breaker_window_in_seconds,
+    min_calls=settings.circuit_breaker_min_calls,
+    failure_ratio=settings.circuit_breaker_failure_ratio,
+    slow_call_duration=settings.circuit_breaker_slow_call_in_seconds,
+    open_for=settings.circuit_breaker_open_in_seconds,
+    is_failure=is_elastic_failure,
+)
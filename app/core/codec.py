@@ -0,0 +1,191 @@
+"""Serialization of cache values.
+
+Every encoded value starts with a one byte header holding the serializer and
+compression ids, so entries written with another configuration stay readable.
+msgpack, zstandard and lz4 are imported only when configured or when a value
+written with them is read.
+"""
+from typing import Any, Callable
+
+import orjson
+from core.config import settings
+from pydantic import BaseModel
+
+
+class Serializer:
+    id: int
+    name: str
+
+    def dumps(self, value: Any) -> bytes:
+        raise NotImplementedError
+
+    def loads(self, data: bytes) -> Any:
+        raise NotImplementedError
+
+
+class OrjsonSerializer(Serializer):
+    id = 1
+    name = "orjson"
+
+    def dumps(self, value: Any) -> bytes:
+        return orjson.dumps(value)
+
+    def loads(self, data: bytes) -> Any:
+        return orjson.loads(data)
+
+
+class MsgpackSerializer(Serializer):
+    id = 2
+    name = "msgpack"
+
+    def __init__(self):
+        import msgpack
+
+        self._packb = msgpack.packb
+        self._unpackb = msgpack.unpackb
+
+    def dumps(self, value: Any) -> bytes:
+        return self._packb(value, use_bin_type=True)
+
+    def loads(self, data: bytes) -> Any:
+        return self._unpackb(data, raw=False)
+
+
+class Compressor:
+    id: int
+    name: str
+
+    def compress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+    def decompress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+
+class NoCompressor(Compressor):
+    id = 0
+    name = "none"
+
+    def compress(self, data: bytes) -> bytes:
+        return data
+
+    def decompress(self, data: bytes) -> bytes:
+        return data
+
+
+class ZstdCompressor(Compressor):
+    id = 1
+    name = "zstd"
+
+    def __init__(self, level: int = 3):
+        import zstandard
+
+        self._compressor = zstandard.ZstdCompressor(level=level)
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return self._decompressor.decompress(data)
+
+
+class Lz4Compressor(Compressor):
+    id = 2
+    name = "lz4"
+
+    def __init__(self):
+        import lz4.frame
+
+        self._compress = lz4.frame.compress
+        self._decompress = lz4.frame.decompress
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return self._decompress(data)
+
+
+SERIALIZERS: dict[str, Callable[[], Serializer]] = {
+    OrjsonSerializer.name: OrjsonSerializer,
+    MsgpackSerializer.name: MsgpackSerializer,
+}
+COMPRESSORS: dict[str, Callable[[], Compressor]] = {
+    NoCompressor.name: NoCompressor,
+    ZstdCompressor.name: ZstdCompressor,
+    Lz4Compressor.name: Lz4Compressor,
+}
+
+
+class CacheCodec:
+    """Encode values with a serializer, compressing those above a threshold."""
+
+    def __init__(
+        self,
+        serializer: str = "orjson",
+        compression: str = "none",
+        compression_min_size: int = 1024,
+    ):
+        self.serializer = SERIALIZERS[serializer]()
+        self.compressor = COMPRESSORS[compression]()
+        self.compression_min_size = compression_min_size
+        self._serializers = {self.serializer.id: self.serializer}
+        self._compressors = {
+            NoCompressor.id: NoCompressor(),
+            self.compressor.id: self.compressor,
+        }
+
+    def dumps(self, value: Any) -> bytes:
+        data = self.serializer.dumps(value)
+        compressor_id = NoCompressor.id
+        if (
+            self.compressor.id != NoCompressor.id
+            and len(data) >= self.compression_min_size
+        ):
+            data = self.compressor.compress(data)
+            compressor_id = self.compressor.id
+        return bytes((self.serializer.id << 4 | compressor_id,)) + data
+
+    def loads(self, data: bytes) -> Any:
+        header = data[0]
+        payload = self._get_compressor(header & 0x0F).decompress(data[1:])
+        return self._get_serializer(header >> 4).loads(payload)
+
+    def _get_serializer(self, serializer_id: int) -> Serializer:
+        serializer = self._serializers.get(serializer_id)
+        if serializer is None:
+            factory = next(s for s in SERIALIZERS.values() if s.id == serializer_id)
+            serializer = self._serializers[serializer_id] = factory()
+        return serializer
+
+    def _get_compressor(self, compressor_id: int) -> Compressor:
+        compressor = self._compressors.get(compressor_id)
+        if compressor is None:
+            factory = next(c for c in COMPRESSORS.values() if c.id == compressor_id)
+            compressor = self._compressors[compressor_id] = factory()
+        return compressor
+
+
+cache_codec = CacheCodec(
+    settings.cache_serializer,
+    settings.cache_compression,
+    settings.cache_compression_min_size,
+)
+
+
+def dump_model(model: BaseModel) -> bytes:
+    return cache_codec.dumps(model.model_dump(mode="json"))
+
+
+def dump_models(models: list[BaseModel]) -> bytes:
+    """Store a list page as one flat payload instead of a list of JSON strings."""
+    return cache_codec.dumps([model.model_dump(mode="json") for model in models])
+
+
+def load_model(model_class: type[BaseModel]) -> Callable[[bytes], BaseModel]:
+    return lambda data: model_class(**cache_codec.loads(data))
+
+
+def load_models(model_class: type[BaseModel]) -> Callable[[bytes], list[BaseModel]]:
+    return lambda data: [model_class(**item) for item in cache_codec.loads(data)]
@@ -1,5 +1,6 @@
 import os
 from logging import config as logging_config
+from typing import Literal
 
 from core.logger import LOGGING
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -28,6 +29,79 @@ class EtlSettings(BaseSettings):
     genre_cache_expire_in_seconds: int
     person_cache_expire_in_seconds: int
 
+    cache_generation_refresh_interval_in_seconds: float = 1.0
+    cache_stale_while_revalidate_in_seconds: int = 0
+    cache_refresh_ahead_beta: float = 1.0
+    negative_cache_expire_in_seconds: int = 60
+    search_cache_expire_in_seconds: int = 60
+    genre_catalog_refresh_interval_in_seconds: int = 300
+
+    cache_lock_enabled: bool = False
+    cache_lock_timeout_in_seconds: float = 5.0
+    cache_lock_poll_interval_in_seconds: float = 0.05
+
+    l1_cache_enabled: bool = False
+    l1_cache_expire_in_seconds: int = 30
+    film_l1_cache_size: int = 1024
+    genre_l1_cache_size: int = 256
+    person_l1_cache_size: int = 1024
+
+    response_cache_enabled: bool = False
+    http_cache_enabled: bool = False
+    film_http_max_age_in_seconds: int = 60
+    genre_http_max_age_in_seconds: int = 300
+    person_http_max_age_in_seconds: int = 60
+
+    cache_serializer: Literal["orjson", "msgpack"] = "orjson"
+    cache_compression: Literal["none", "zstd", "lz4"] = "none"
+    cache_compression_min_size: int = 1024
+
+    max_result_window: int = 10000
+    films_pit_enabled: bool = False
+    pit_keep_alive: str = "1m"
+
+    export_batch_size: int = 1000
+    batch_max_ids: int = 100
+
+    loader_chunk_size: int = 500
+    loader_concurrency: int = 4
+    loader_max_retries: int = 3
+    warmup_enabled: bool = False
+    warmup_pages: int = 3
+    warmup_page_size: int = 50
+    warmup_top_films: int = 100
+    warmup_concurrency: int = 8
+    warmup_lock_timeout_in_seconds: int = 300
+    warmup_poll_interval_in_seconds: float = 1.0
+    warmup_attempts: int = 3
+    warmup_retry_interval_in_seconds: float = 10.0
+    metrics_enabled: bool = True
+
+    redis_max_connections: int = 100
+    redis_pool_timeout_in_seconds: float = 1.0
+    redis_connect_timeout_in_seconds: float = 1.0
+    redis_socket_timeout_in_seconds: float = 1.0
+    redis_socket_keepalive: bool = True
+    redis_health_check_interval_in_seconds: int = 30
+    redis_max_retries: int = 2
+    elastic_connections_per_node: int = 25
+    elastic_request_timeout_in_seconds: float = 5.0
+    elastic_max_retries: int = 2
+    elastic_retry_on_timeout: bool = False
+    request_deadline_in_seconds: float = 5.0
+
+    circuit_breaker_enabled: bool = True
+    circuit_breaker_window_in_seconds: float = 10.0
+    circuit_breaker_min_calls: int = 20
+    circuit_breaker_failure_ratio: float = 0.5
+    circuit_breaker_slow_call_in_seconds: float = 2.0
+    circuit_breaker_open_in_seconds: float = 5.0
+    stale_copy_expire_in_seconds: int = 86400
+
+    log_queue_enabled: bool = True
+    log_sample_rates: dict[str, float] = {}
+    log_rate_limits: dict[str, float] = {}
+
     @property
     def elastic_dsn(self):
         return f"http://{self.elastic_host}:{self.elastic_port}"
@@ -0,0 +1,67 @@
+import asyncio
+import time
+from contextvars import ContextVar
+from typing import Awaitable, Callable, TypeVar
+
+from core.metrics import counters
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+T = TypeVar("T")
+
+# Monotonic time by which the request being served has to be answered.
+request_deadline: ContextVar[float | None] = ContextVar(
+    "request_deadline", default=None
+)
+
+
+class DeadlineExceeded(Exception):
+    """The time budget of the request ran out before a downstream call finished."""
+
+
+def remaining() -> float | None:
+    """Seconds left of the current request budget, `None` outside of requests."""
+    deadline = request_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def check_deadline(operation: str):
+    budget = remaining()
+    if budget is not None and budget <= 0:
+        counters.inc("deadline_exceeded_total", operation=operation)
+        raise DeadlineExceeded(operation)
+
+
+async def within_deadline(call: Callable[[], Awaitable[T]], operation: str) -> T:
+    """Await `call()` for at most the rest of the request budget.
+
+    Fails fast, without calling, when the budget is already spent.
+    """
+    check_deadline(operation)
+    budget = remaining()
+    if budget is None:
+        return await call()
+    try:
+        return await asyncio.wait_for(call(), budget)
+    except asyncio.TimeoutError:
+        counters.inc("deadline_exceeded_total", operation=operation)
+        raise DeadlineExceeded(operation) from None
+
+
+class DeadlineMiddleware:
+    """Give every HTTP request a time budget the services check downstream."""
+
+    def __init__(self, app: ASGIApp, timeout: float):
+        self.app = app
+        self.timeout = timeout
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = request_deadline.set(time.monotonic() + self.timeout)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_deadline.reset(token)
@@ -0,0 +1,103 @@
+import hashlib
+
+from core.metrics import counters
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+def make_etag(body: bytes) -> str:
+    return f'"{hashlib.md5(body).hexdigest()}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of If-None-Match against a strong ETag (RFC 9110)."""
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def cache_control(max_age: int) -> str:
+    # Without a max-age clients still revalidate every request with the ETag.
+    return f"public, max-age={max_age}" if max_age > 0 else "no-cache"
+
+
+class HttpCacheMiddleware:
+    """Add ETag and Cache-Control to JSON GET responses and answer 304s.
+
+    The ETag is the hash of the body. Placed outside `ResponseCacheMiddleware`
+    a revalidation of a cached response is answered from Redis alone.
+    """
+
+    def __init__(self, app: ASGIApp, max_age_by_prefix: dict[str, int]):
+        self.app = app
+        self.max_age_by_prefix = max_age_by_prefix
+
+    def _max_age(self, path: str) -> int | None:
+        for prefix, max_age in self.max_age_by_prefix.items():
+            if path.startswith(prefix):
+                return max_age
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        max_age = None
+        if scope["type"] == "http" and scope["method"] == "GET":
+            max_age = self._max_age(scope["path"])
+        if max_age is None:
+            await self.app(scope, receive, send)
+            return
+
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        start = None
+        chunks = []
+
+        async def send_wrapper(message: Message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message.get("headers", []))
+                if message["status"] == 200 and headers.get(
+                    "content-type", ""
+                ).startswith("application/json"):
+                    start = message
+                    return
+            elif message["type"] == "http.response.body" and start is not None:
+                chunks.append(message.get("body", b""))
+                if message.get("more_body", False):
+                    return
+                await self._send_buffered(
+                    start, b"".join(chunks), if_none_match, max_age, send
+                )
+                return
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def _send_buffered(
+        self,
+        start: Message,
+        body: bytes,
+        if_none_match: str | None,
+        max_age: int,
+        send: Send,
+    ):
+        etag = make_etag(body)
+        validators = [
+            (b"etag", etag.encode()),
+            (b"cache-control", cache_control(max_age).encode()),
+        ]
+        if if_none_match and etag_matches(if_none_match, etag):
+            counters.inc("http_not_modified_total")
+            await send(
+                {"type": "http.response.start", "status": 304, "headers": validators}
+            )
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        headers = [
+            (name, value)
+            for name, value in start.get("headers", [])
+            if name not in (b"etag", b"cache-control")
+        ]
+        await send({**start, "headers": headers + validators})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any
+from uuid import uuid4
+
+from core.config import settings
+from core.metrics import counters
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "cache:invalidate"
+WORKER_ID = uuid4().hex
+# Seconds a read of the invalidation channel waits for a message.
+LISTEN_POLL_INTERVAL = 5.0
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Size and TTL bounded LRU of already decoded objects."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        item = self._data.get(key, _MISSING)
+        if item is _MISSING:
+            return default
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: float | None = None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+_caches: dict[str, LRUCache] = {}
+
+
+def get_l1_cache(namespace: str) -> LRUCache | None:
+    """Return the L1 cache of an entity type or None when the tier is disabled."""
+    if not settings.l1_cache_enabled:
+        return None
+    cache = _caches.get(namespace)
+    if cache is None:
+        maxsize = getattr(settings, f"{namespace}_l1_cache_size", 0)
+        if maxsize <= 0:
+            return None
+        cache = _caches[namespace] = LRUCache(
+            maxsize, settings.l1_cache_expire_in_seconds
+        )
+    return cache
+
+
+def invalidation_message(namespace: str, key: str) -> str:
+    return f"{WORKER_ID}|{namespace}|{key}"
+
+
+def publish_invalidation(pipe: Pipeline, namespace: str, key: str):
+    """Queue the message dropping `key` from the L1 caches of other workers."""
+    pipe.publish(INVALIDATION_CHANNEL, invalidation_message(namespace, key))
+
+
+def evict(message: str):
+    worker_id, namespace, key = message.split("|", 2)
+    if worker_id == WORKER_ID:
+        return
+    cache = _caches.get(namespace)
+    if cache is not None:
+        cache.delete(key)
+        counters.inc("l1_cache_invalidations_total", namespace=namespace)
+
+
+async def listen_for_invalidations(redis: Redis):
+    """Drop L1 entries rewritten or deleted by other workers.
+
+    The channel is polled with an explicit read timeout: a blocking `listen()`
+    would hit the pool's `socket_timeout` on every idle second and reconnect,
+    losing the messages published meanwhile.
+    """
+    pubsub = redis.pubsub(ignore_subscribe_messages=True)
+    await pubsub.subscribe(INVALIDATION_CHANNEL)
+    try:
+        while True:
+            try:
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=LISTEN_POLL_INTERVAL
+                )
+                if message is not None:
+                    data = message["data"]
+                    evict(data.decode() if isinstance(data, bytes) else data)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Entries could have changed while we were disconnected.
+                logger.exception("L1 cache invalidation listener failed, resubscribing")
+                for cache in _caches.values():
+                    cache.clear()
+                await asyncio.sleep(1)
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+    finally:
+        await pubsub.aclose()
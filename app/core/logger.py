@@ -1,4 +1,8 @@
 import logging
+import queue
+import random
+import time
+from logging.handlers import QueueHandler, QueueListener
 
 LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 LOG_DEFAULT_HANDLERS = [
@@ -60,5 +64,87 @@ LOGGING = {
 }
 
 
+class SamplingFilter(logging.Filter):
+    """Pass a random share of the records and at most `rate_limit` per second.
+
+    Errors are always passed. The rate limit is a token bucket holding up to
+    one second of records, so short bursts are let through.
+    """
+
+    def __init__(self, sample_rate: float = 1.0, rate_limit: float = 0):
+        super().__init__()
+        self.sample_rate = sample_rate
+        self.rate_limit = rate_limit
+        self.dropped = 0
+        self._tokens = rate_limit
+        self._updated = time.monotonic()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.ERROR:
+            return True
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            self.dropped += 1
+            return False
+        if self.rate_limit:
+            now = time.monotonic()
+            self._tokens = min(
+                self.rate_limit, self._tokens + (now - self._updated) * self.rate_limit
+            )
+            self._updated = now
+            if self._tokens < 1:
+                self.dropped += 1
+                return False
+            self._tokens -= 1
+        return True
+
+
+class DeferredQueueHandler(QueueHandler):
+    """Put records on the queue unformatted, the listener thread formats them.
+
+    `QueueHandler.prepare` formats the message and the traceback in the
+    calling thread, so that records can be pickled for another process. The
+    queues here stay in the process, so records are passed as they are. Their
+    arguments are formatted later and must not be mutated after logging.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def start_queue_logging(
+    sample_rates: dict[str, float], rate_limits: dict[str, float]
+) -> list[QueueListener]:
+    """Move the configured handlers to background threads behind queues.
+
+    Loggers only put records on a queue, a listener thread formats and writes
+    them, so a slow stdout never blocks the event loop. Each logger with its
+    own handlers gets its own queue, as the listener passes every record to
+    all of its handlers. Sampling and rate limits are set per logger name.
+    """
+    for name in sample_rates.keys() | rate_limits.keys():
+        logging.getLogger(name).addFilter(
+            SamplingFilter(sample_rates.get(name, 1.0), rate_limits.get(name, 0))
+        )
+
+    listeners = []
+    for name in LOGGING["loggers"]:
+        logger = logging.getLogger(name)
+        handlers = [
+            handler
+            for handler in logger.handlers
+            if not isinstance(handler, QueueHandler)
+        ]
+        if not handlers:
+            continue
+        records = queue.SimpleQueue()
+        for handler in handlers:
+            logger.removeHandler(handler)
+        logger.addHandler(DeferredQueueHandler(records))
+        listener = QueueListener(records, *handlers, respect_handler_level=True)
+        listener.start()
+        listeners.append(listener)
+    return listeners
+
+
 logging.basicConfig(format="%(asctime)s %(levelname)s: %(message)s", level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -0,0 +1,143 @@
+import os
+import time
+from collections import Counter as CallCounter
+from collections import defaultdict
+from contextvars import ContextVar
+
+from prometheus_client import disable_created_metrics
+from prometheus_client.exposition import CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client.metrics import Counter, Histogram
+from prometheus_client.multiprocess import MultiProcessCollector
+from prometheus_client.registry import REGISTRY, CollectorRegistry
+from starlette.responses import Response
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+disable_created_metrics()
+
+
+class Counters:
+    """Process-wide monotonic counters keyed by name and a set of labels.
+
+    Every counter is mirrored by a Prometheus counter created on first use, so
+    the values are exported on `/metrics` as well.
+    """
+
+    def __init__(self):
+        self._values: dict[tuple, int] = defaultdict(int)
+        self._metrics: dict[str, Counter] = {}
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name: str, value: int = 1, **labels):
+        self._values[self._key(name, labels)] += value
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = Counter(
+                name, name.replace("_", " "), sorted(labels)
+            )
+        (metric.labels(**labels) if labels else metric).inc(value)
+
+    def get(self, name: str, **labels) -> int:
+        return self._values.get(self._key(name, labels), 0)
+
+    def snapshot(self) -> dict[tuple, int]:
+        return dict(self._values)
+
+    def clear(self):
+        """Reset the in-process values, exported counters stay monotonic."""
+        self._values.clear()
+
+
+counters = Counters()
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Latency of HTTP requests by route",
+    ["method", "route", "status"],
+)
+REQUEST_BACKEND_CALLS = Histogram(
+    "http_request_backend_calls",
+    "Elasticsearch and Redis calls made while serving one request",
+    ["route", "backend"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50),
+)
+BACKEND_CALL_DURATION = Histogram(
+    "backend_call_duration_seconds",
+    "Latency of Elasticsearch and Redis calls by operation",
+    ["backend", "operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+
+# Calls to each backend made by the request being served.
+request_calls: ContextVar[CallCounter | None] = ContextVar(
+    "request_calls", default=None
+)
+
+
+def observe_call(backend: str, operation: str, started: float):
+    BACKEND_CALL_DURATION.labels(backend, operation).observe(
+        time.perf_counter() - started
+    )
+    calls = request_calls.get()
+    if calls is not None:
+        calls[backend] += 1
+
+
+def metrics_response() -> Response:
+    registry = REGISTRY
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        # Several gunicorn workers, aggregate the values all of them wrote.
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+
+class MetricsMiddleware:
+    """Record latency and backend calls of every HTTP request by route.
+
+    Routes are labelled with their path template, e.g. `/api/v1/films/{film_id}`,
+    and unknown paths share one label to keep the cardinality bounded.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    def _route(self, scope: Scope) -> str:
+        route = scope.get("route")
+        if route is not None:
+            return route.path
+        # Not routed, e.g. answered by the response cache.
+        for route in scope["app"].router.routes:
+            if route.matches(scope)[0] == Match.FULL:
+                return route.path
+        return "unmatched"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        calls = CallCounter()
+        token = request_calls.set(calls)
+
+        async def send_wrapper(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_calls.reset(token)
+            route = self._route(scope)
+            REQUEST_DURATION.labels(scope["method"], route, status).observe(
+                time.perf_counter() - started
+            )
+            for backend in ("elasticsearch", "redis"):
+                REQUEST_BACKEND_CALLS.labels(route, backend).observe(calls[backend])
@@ -0,0 +1,110 @@
+import hashlib
+from urllib.parse import parse_qsl, urlencode
+
+import orjson
+from core.cache_keys import CACHE_FORMAT_VERSION, response_generation
+from core.metrics import counters
+from core.stale import STALE_HEADER
+from db import redis
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+def normalize_request(path: str, query_string: bytes) -> str:
+    """Build a canonical form of a route so equivalent requests share an entry.
+
+    Parameters are ordered by name, keeping the relative order of repeated
+    ones (e.g. `sort`), which is significant for the routers.
+    """
+    params = parse_qsl(query_string.decode("latin-1"), keep_blank_values=True)
+    params.sort(key=lambda item: item[0])
+    return f"{path.rstrip('/')}?{urlencode(params)}"
+
+
+def pack_response(headers: dict[str, str], body: bytes) -> bytes:
+    """Prefix the body with the custom (`x-*`) headers it was sent with."""
+    return orjson.dumps(headers) + b"\n" + body
+
+
+def unpack_response(data: bytes) -> tuple[dict[str, str], bytes]:
+    headers, _, body = data.partition(b"\n")
+    return orjson.loads(headers), body
+
+
+def response_cache_key(path: str, query_string: bytes, generation: str) -> str:
+    request = normalize_request(path, query_string)
+    digest = hashlib.md5(request.encode()).hexdigest()
+    return f"v{CACHE_FORMAT_VERSION}:response:{generation}:{digest}"
+
+
+class ResponseCacheMiddleware:
+    """Cache serialized JSON bodies of successful GET responses in Redis.
+
+    A hit is answered with the stored bytes directly, skipping routing,
+    services, pydantic validation and serialization.
+    """
+
+    def __init__(self, app: ASGIApp, expire_by_prefix: dict[str, int]):
+        self.app = app
+        self.expire_by_prefix = expire_by_prefix
+
+    def _route(self, path: str) -> tuple[str, int] | None:
+        for prefix, expire in self.expire_by_prefix.items():
+            if path.startswith(prefix):
+                return prefix, expire
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        route = None
+        if scope["type"] == "http" and scope["method"] == "GET":
+            route = self._route(scope["path"])
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+
+        prefix, expire = route
+        cache_key = response_cache_key(
+            scope["path"],
+            scope["query_string"],
+            await response_generation(redis.redis),
+        )
+        data = await redis.redis.get(cache_key)
+        if data:
+            counters.inc("response_cache_hits_total", route=prefix)
+            headers, body = unpack_response(data)
+            response = Response(
+                content=body, media_type="application/json", headers=headers
+            )
+            await response(scope, receive, send)
+            return
+
+        counters.inc("response_cache_misses_total", route=prefix)
+        cacheable = False
+        custom_headers = {}
+        chunks = []
+
+        async def send_wrapper(message: Message):
+            nonlocal cacheable
+            if message["type"] == "http.response.start":
+                headers = dict(message.get("headers", []))
+                # Responses built from stale copies are not stored.
+                cacheable = (
+                    message["status"] == 200
+                    and headers.get(b"content-type", b"").startswith(
+                        b"application/json"
+                    )
+                    and STALE_HEADER not in headers
+                )
+                for name, value in headers.items():
+                    if name.startswith(b"x-"):
+                        custom_headers[name.decode("latin-1")] = value.decode("latin-1")
+            elif message["type"] == "http.response.body" and cacheable:
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+        if cacheable:
+            await redis.redis.set(
+                cache_key, pack_response(custom_headers, b"".join(chunks)), expire
+            )
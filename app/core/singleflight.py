@@ -0,0 +1,49 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+
+from core.deadline import request_deadline
+from core.metrics import counters
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one in-flight fetch.
+
+    The fetch runs as a separate task, so a cancelled caller does not abort
+    the fetch the other waiters depend on. For the same reason it is not
+    bound to the request deadline of the caller that started it.
+    """
+
+    def __init__(self):
+        self._calls: dict[str, asyncio.Task] = {}
+
+    async def do(
+        self, key: str, fetch: Callable[[], Awaitable[Any]], namespace: str = ""
+    ) -> Any:
+        task = self._calls.get(key)
+        if task is not None:
+            counters.inc("singleflight_coalesced_total", namespace=namespace)
+            return await asyncio.shield(task)
+
+        counters.inc("singleflight_fetches_total", namespace=namespace)
+        task = asyncio.ensure_future(self._run(fetch))
+        self._calls[key] = task
+        task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task)
+
+    @staticmethod
+    async def _run(fetch: Callable[[], Awaitable[Any]]) -> Any:
+        # The task runs in a copy of the caller's context, this leaves it alone.
+        request_deadline.set(None)
+        return await fetch()
+
+    def _forget(self, key: str, task: asyncio.Task):
+        self._calls.pop(key, None)
+        if not task.cancelled():
+            # Mark the exception as retrieved when every waiter went away.
+            task.exception()
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+
+single_flight = SingleFlight()
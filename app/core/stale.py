@@ -0,0 +1,41 @@
+from contextvars import ContextVar
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+STALE_HEADER = b"x-served-stale"
+
+# Cache keys served from stale copies while handling the current request.
+stale_responses: ContextVar[list[str] | None] = ContextVar(
+    "stale_responses", default=None
+)
+
+
+def mark_stale(cache_key: str):
+    served = stale_responses.get()
+    if served is not None:
+        served.append(cache_key)
+
+
+class StaleResponseMiddleware:
+    """Add the `X-Served-Stale` header to responses built from stale copies."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        served = []
+        token = stale_responses.set(served)
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start" and served:
+                message["headers"] = [*message.get("headers", []), (STALE_HEADER, b"1")]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            stale_responses.reset(token)
@@ -1,7 +1,37 @@
+import time
+
+from core.config import settings
+from core.metrics import observe_call
 from elasticsearch import AsyncElasticsearch
 
 es: AsyncElasticsearch | None = None
 
 
+class InstrumentedElasticsearch(AsyncElasticsearch):
+    """Client recording the latency of every API call and counting it per request."""
+
+    async def perform_request(self, method: str, path: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await super().perform_request(method, path, **kwargs)
+        finally:
+            observe_call(
+                "elasticsearch", kwargs.get("endpoint_id") or method.lower(), started
+            )
+
+
+def create_elastic() -> AsyncElasticsearch:
+    elastic_class = InstrumentedElasticsearch
+    if not settings.metrics_enabled:
+        elastic_class = AsyncElasticsearch
+    return elastic_class(
+        hosts=[settings.elastic_dsn],
+        connections_per_node=settings.elastic_connections_per_node,
+        request_timeout=settings.elastic_request_timeout_in_seconds,
+        max_retries=settings.elastic_max_retries,
+        retry_on_timeout=settings.elastic_retry_on_timeout,
+    )
+
+
 async def get_elastic() -> AsyncElasticsearch:
     return es
@@ -1,7 +1,64 @@
-from redis.asyncio import Redis
+import time
+
+from core.config import settings
+from core.metrics import observe_call
+from redis.asyncio import BlockingConnectionPool, Redis
+from redis.asyncio.client import Pipeline
+from redis.asyncio.retry import Retry
+from redis.backoff import ExponentialBackoff
 
 redis: Redis | None = None
 
 
+class InstrumentedPipeline(Pipeline):
+    async def execute(self, raise_on_error: bool = True):
+        started = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            observe_call("redis", "pipeline", started)
+
+
+class InstrumentedRedis(Redis):
+    """Client recording the latency of every command and counting it per request.
+
+    A pipeline is recorded as one call, as it is one round trip.
+    """
+
+    async def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            observe_call("redis", str(args[0]).lower(), started)
+
+    def pipeline(self, transaction: bool = True, shard_hint=None) -> Pipeline:
+        return InstrumentedPipeline(
+            self.connection_pool, self.response_callbacks, transaction, shard_hint
+        )
+
+
+def create_redis() -> Redis:
+    """Build the client from the pool, timeout and retry settings.
+
+    The pool is bounded and blocking: when all connections are busy a command
+    waits up to `redis_pool_timeout_in_seconds` for one and then fails,
+    instead of opening connections without limit.
+    """
+    pool = BlockingConnectionPool.from_url(
+        settings.redis_dsn,
+        max_connections=settings.redis_max_connections,
+        timeout=settings.redis_pool_timeout_in_seconds,
+        socket_connect_timeout=settings.redis_connect_timeout_in_seconds,
+        socket_timeout=settings.redis_socket_timeout_in_seconds,
+        socket_keepalive=settings.redis_socket_keepalive,
+        health_check_interval=settings.redis_health_check_interval_in_seconds,
+        retry=Retry(ExponentialBackoff(), settings.redis_max_retries),
+        retry_on_timeout=True,
+    )
+    redis_class = InstrumentedRedis if settings.metrics_enabled else Redis
+    return redis_class.from_pool(pool)
+
+
 async def get_redis() -> Redis:
     return redis
@@ -0,0 +1,56 @@
+"""Invalidate cached data after the indices were changed.
+
+    python invalidate.py all                    # every namespace, e.g. after a reload
+    python invalidate.py namespace film         # all film keys
+    python invalidate.py film <id> [<id> ...]   # single films and the lists with them,
+                                                # filmographies included
+"""
+import argparse
+import asyncio
+import logging
+
+from core.cache_keys import NAMESPACES, bump_generation
+from core.config import settings
+from redis.asyncio import Redis
+from services.film import FilmService
+from services.genre import GenreService
+from services.person import PersonService
+
+logger = logging.getLogger(__name__)
+
+SERVICES = {
+    "film": FilmService,
+    "genre": GenreService,
+    "person": PersonService,
+}
+
+
+async def main(args: argparse.Namespace):
+    redis = Redis.from_url(settings.redis_dsn)
+    try:
+        if args.target == "all":
+            generation = await bump_generation(redis)
+            logger.info(f"Cache generation bumped to {generation}")
+        elif args.target == "namespace":
+            for namespace in args.ids:
+                generation = await bump_generation(redis, namespace)
+                logger.info(f"Cache generation of {namespace} bumped to {generation}")
+        else:
+            service = SERVICES[args.target](redis, None)
+            for entity_id in args.ids:
+                await service.invalidate_entity(entity_id)
+                logger.info(f"Invalidated {args.target} {entity_id}")
+    finally:
+        await redis.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("target", choices=["all", "namespace", *NAMESPACES])
+    parser.add_argument("ids", nargs="*")
+    args = parser.parse_args()
+    if args.target == "namespace" and not set(args.ids) <= set(NAMESPACES):
+        parser.error(f"namespaces must be some of {', '.join(NAMESPACES)}")
+    asyncio.run(main(args))
@@ -0,0 +1,203 @@
+"""Load the bundled index definitions and documents into Elasticsearch.
+
+    python loader.py [--data-dir ../data] [--index movies ...] [--recreate]
+
+Every `<index>_index.json` in the data directory is used to create the index
+and the matching `<index>_data.json` dump (one elasticdump document per line)
+is streamed into it with the async bulk helper by several concurrent workers.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+from itertools import islice
+from typing import Iterator
+
+import orjson
+from core.cache_keys import bump_generation
+from core.config import BASE_DIR, settings
+from elastic_transport import ConnectionError, ConnectionTimeout
+from elasticsearch import ApiError, AsyncElasticsearch
+from elasticsearch.helpers import async_streaming_bulk
+from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.path.join(os.path.dirname(BASE_DIR), "data")
+
+
+def read_actions(path: str, index: str) -> Iterator[dict]:
+    """Lazily turn an elasticdump file into bulk index actions."""
+    with open(path, "rb") as data_file:
+        for line in data_file:
+            if not line.strip():
+                continue
+            document = orjson.loads(line)
+            yield {
+                "_index": index,
+                "_id": document["_id"],
+                "_source": document["_source"],
+            }
+
+
+def chunked(actions: Iterator[dict], size: int) -> Iterator[list[dict]]:
+    while chunk := list(islice(actions, size)):
+        yield chunk
+
+
+class Loader:
+    def __init__(
+        self,
+        elastic: AsyncElasticsearch,
+        chunk_size: int,
+        concurrency: int,
+        max_retries: int,
+    ):
+        self.elastic = elastic
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+
+    async def create_index(self, index: str, definition: dict, recreate: bool) -> str:
+        """Create the index with refresh disabled, return the refresh interval to restore."""
+        refresh_interval = definition.get("settings", {}).get("refresh_interval", "1s")
+        if await self.elastic.indices.exists(index=index):
+            if not recreate:
+                current = await self.elastic.indices.get_settings(index=index)
+                refresh_interval = (
+                    current[index]["settings"]["index"].get("refresh_interval")
+                    or refresh_interval
+                )
+                await self.set_refresh_interval(index, "-1")
+                return refresh_interval
+            await self.elastic.indices.delete(index=index)
+
+        index_settings = {**definition.get("settings", {}), "refresh_interval": "-1"}
+        await self.elastic.indices.create(
+            index=index, settings=index_settings, mappings=definition.get("mappings")
+        )
+        return refresh_interval
+
+    async def set_refresh_interval(self, index: str, refresh_interval: str):
+        await self.elastic.indices.put_settings(
+            index=index, settings={"index": {"refresh_interval": refresh_interval}}
+        )
+
+    async def load_index(self, index: str, data_dir: str, recreate: bool) -> int:
+        with open(os.path.join(data_dir, f"{index}_index.json"), "rb") as index_file:
+            definition = orjson.loads(index_file.read())
+        refresh_interval = await self.create_index(index, definition, recreate)
+
+        started = time.perf_counter()
+        try:
+            loaded = await self.bulk(
+                read_actions(os.path.join(data_dir, f"{index}_data.json"), index)
+            )
+        finally:
+            await self.set_refresh_interval(index, refresh_interval)
+        await self.elastic.indices.refresh(index=index)
+
+        elapsed = time.perf_counter() - started
+        logger.info(
+            f"Loaded {loaded} documents into {index} in {elapsed:.1f}s "
+            f"({loaded / elapsed:.0f} docs/sec)"
+        )
+        return loaded
+
+    async def bulk(self, actions: Iterator[dict]) -> int:
+        """Index chunks of actions with `concurrency` workers.
+
+        The queue is bounded, so the data file is read only as fast as the
+        workers can push it.
+        """
+        queue: asyncio.Queue[list[dict] | None] = asyncio.Queue(self.concurrency * 2)
+
+        async def produce():
+            for chunk in chunked(actions, self.chunk_size):
+                await queue.put(chunk)
+            for _ in range(self.concurrency):
+                await queue.put(None)
+
+        tasks = [asyncio.create_task(produce())]
+        tasks += [
+            asyncio.create_task(self._worker(queue)) for _ in range(self.concurrency)
+        ]
+        try:
+            _, *loaded = await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        return sum(loaded)
+
+    async def _worker(self, queue: asyncio.Queue) -> int:
+        loaded = 0
+        while (chunk := await queue.get()) is not None:
+            loaded += await self._send_chunk(chunk)
+        return loaded
+
+    async def _send_chunk(self, chunk: list[dict]) -> int:
+        """Send one chunk, retrying rejected documents and failed requests."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                loaded = 0
+                async for ok, item in async_streaming_bulk(
+                    self.elastic,
+                    chunk,
+                    chunk_size=len(chunk),
+                    max_retries=self.max_retries,
+                    raise_on_error=False,
+                ):
+                    if ok:
+                        loaded += 1
+                    else:
+                        logger.error(f"Failed to index document: {item}")
+                return loaded
+            except (ConnectionError, ConnectionTimeout, ApiError) as error:
+                if isinstance(error, ApiError) and error.status_code != 429:
+                    raise
+                if attempt == self.max_retries:
+                    raise
+                backoff = 2**attempt
+                logger.warning(f"Bulk request failed ({error}), retry in {backoff}s")
+                await asyncio.sleep(backoff)
+        return 0
+
+
+async def main(args: argparse.Namespace):
+    elastic = AsyncElasticsearch(hosts=[settings.elastic_dsn])
+    loader = Loader(elastic, args.chunk_size, args.concurrency, args.max_retries)
+    started = time.perf_counter()
+    try:
+        loaded = 0
+        for index in args.index:
+            loaded += await loader.load_index(index, args.data_dir, args.recreate)
+    finally:
+        await elastic.close()
+    elapsed = time.perf_counter() - started
+    logger.info(f"Loaded {loaded} documents in {elapsed:.1f}s")
+
+    if args.invalidate_cache:
+        redis = Redis.from_url(settings.redis_dsn)
+        try:
+            generation = await bump_generation(redis)
+        finally:
+            await redis.close()
+        logger.info(f"Cache generation bumped to {generation}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--index", nargs="+", default=["genres", "persons", "movies"])
+    parser.add_argument("--recreate", action="store_true", help="Drop existing indices")
+    parser.add_argument(
+        "--no-invalidate-cache",
+        dest="invalidate_cache",
+        action="store_false",
+        help="Keep serving cached data loaded before",
+    )
+    parser.add_argument("--chunk-size", type=int, default=settings.loader_chunk_size)
+    parser.add_argument("--concurrency", type=int, default=settings.loader_concurrency)
+    parser.add_argument("--max-retries", type=int, default=settings.loader_max_retries)
+    asyncio.run(main(parser.parse_args()))
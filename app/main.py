@@ -1,10 +1,22 @@
+import asyncio
+import math
+
 from api.v1 import films, genres, persons
+from core.circuit_breaker import CircuitOpen, is_elastic_failure
 from core.config import settings
+from core.deadline import DeadlineExceeded, DeadlineMiddleware
+from core.http_cache import HttpCacheMiddleware
+from core.l1_cache import listen_for_invalidations
+from core.logger import start_queue_logging
+from core.metrics import MetricsMiddleware, metrics_response
+from core.response_cache import ResponseCacheMiddleware
+from core.stale import StaleResponseMiddleware
 from db import elastic, redis
-from elasticsearch import AsyncElasticsearch
-from fastapi import FastAPI
+from elasticsearch import ApiError, TransportError
+from fastapi import FastAPI, Request
 from fastapi.responses import ORJSONResponse
-from redis.asyncio import Redis
+from services.genre_catalog import genre_catalog
+from services.warmup import warm_up_once
 
 app = FastAPI(
     title=settings.project_name,
@@ -13,17 +25,111 @@ app = FastAPI(
     default_response_class=ORJSONResponse,
 )
 
+# Innermost, so the cache middlewares see which responses are stale.
+app.add_middleware(StaleResponseMiddleware)
+
+if settings.response_cache_enabled:
+    app.add_middleware(
+        ResponseCacheMiddleware,
+        # The first matching prefix wins, so the search goes before the films.
+        expire_by_prefix={
+            "/api/v1/films/search": settings.search_cache_expire_in_seconds,
+            "/api/v1/films": settings.film_cache_expire_in_seconds,
+            "/api/v1/genres": settings.genre_cache_expire_in_seconds,
+            "/api/v1/persons": settings.person_cache_expire_in_seconds,
+        },
+    )
+
+if settings.http_cache_enabled:
+    # Added last, so it wraps the response cache and 304s skip the routers.
+    app.add_middleware(
+        HttpCacheMiddleware,
+        max_age_by_prefix={
+            "/api/v1/films": settings.film_http_max_age_in_seconds,
+            "/api/v1/genres": settings.genre_http_max_age_in_seconds,
+            "/api/v1/persons": settings.person_http_max_age_in_seconds,
+        },
+    )
+
+if settings.request_deadline_in_seconds > 0:
+    # Outside the caches, the budget covers their Redis round trips as well.
+    app.add_middleware(DeadlineMiddleware, timeout=settings.request_deadline_in_seconds)
+
+if settings.metrics_enabled:
+    # Outermost, so the recorded latency includes the other middlewares.
+    app.add_middleware(MetricsMiddleware)
+
 
 @app.on_event("startup")
 async def startup():
-    redis.redis = Redis.from_url(settings.redis_dsn)
-    elastic.es = AsyncElasticsearch(hosts=[settings.elastic_dsn])
+    app.state.log_listeners = []
+    if settings.log_queue_enabled:
+        app.state.log_listeners = start_queue_logging(
+            settings.log_sample_rates, settings.log_rate_limits
+        )
+    redis.redis = redis.create_redis()
+    elastic.es = elastic.create_elastic()
+    await genre_catalog.refresh(elastic.es, redis.redis)
+    if settings.l1_cache_enabled:
+        app.state.l1_invalidation = asyncio.create_task(
+            listen_for_invalidations(redis.redis)
+        )
+    app.state.warmup = None
+    if settings.warmup_enabled:
+        app.state.warmup = asyncio.create_task(warm_up_once(redis.redis, elastic.es))
 
 
 @app.on_event("shutdown")
 async def shutdown():
+    if settings.l1_cache_enabled:
+        app.state.l1_invalidation.cancel()
+    if app.state.warmup is not None:
+        app.state.warmup.cancel()
     await redis.redis.close()
     await elastic.es.close()
+    for listener in app.state.log_listeners:
+        # Writes out the records still queued.
+        listener.stop()
+
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded(request: Request, exc: DeadlineExceeded):
+    return ORJSONResponse(
+        {"detail": "request deadline exceeded"},
+        status_code=503,
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.exception_handler(CircuitOpen)
+@app.exception_handler(TransportError)
+@app.exception_handler(ApiError)
+async def backend_unavailable(request: Request, exc: Exception):
+    if isinstance(exc, ApiError) and not is_elastic_failure(exc):
+        # A bad query is a bug, left to the server error handler.
+        raise exc
+    return ORJSONResponse(
+        {"detail": "search backend unavailable"},
+        status_code=503,
+        headers={
+            "Retry-After": str(math.ceil(settings.circuit_breaker_open_in_seconds))
+        },
+    )
+
+
+@app.get("/api/ready", include_in_schema=False)
+async def ready():
+    """Readiness probe, fails until the cache warm-up has finished or given up."""
+    if app.state.warmup is not None and not app.state.warmup.done():
+        return ORJSONResponse({"status": "warming up"}, status_code=503)
+    return {"status": "ready"}
+
+
+if settings.metrics_enabled:
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return metrics_response()
 
 
 app.include_router(films.router, prefix="/api/v1/films", tags=["films"])
@@ -21,3 +21,8 @@ class FilmDetail(Film):
     actors: list[FilmPerson]
     writers: list[FilmPerson]
     directors: list[FilmPerson]
+
+
+class FilmPage(OrjsonBaseModel):
+    films: list[Film]
+    next_cursor: str | None = None
@@ -1,6 +1,7 @@
 from uuid import UUID
 
 from models.base import OrjsonBaseModel
+from models.film import Film
 
 
 class PersonFilm(OrjsonBaseModel):
@@ -12,3 +13,11 @@ class Person(OrjsonBaseModel):
     id: UUID
     full_name: str
     films: list[PersonFilm] | None
+
+
+class FilmographyFilm(Film):
+    roles: list[str]
+
+
+class Filmography(OrjsonBaseModel):
+    films: list[FilmographyFilm]
@@ -0,0 +1,495 @@
+import asyncio
+import contextvars
+import logging
+import math
+import random
+import struct
+import time
+import unicodedata
+from functools import partial
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+from core.cache_keys import CacheKeyBuilder, bump_generation
+from core.circuit_breaker import CircuitOpen, elastic_breaker
+from core.config import settings
+from core.deadline import DeadlineExceeded, check_deadline, within_deadline
+from core.l1_cache import get_l1_cache, publish_invalidation
+from core.metrics import counters
+from core.singleflight import single_flight
+from core.stale import mark_stale
+from elasticsearch import ApiError, AsyncElasticsearch, TransportError
+from pydantic import BaseModel
+from redis.asyncio import Redis
+from redis.exceptions import LockError
+
+logger = logging.getLogger(__name__)
+
+
+def source_fields(model_class: type[BaseModel]) -> list[str]:
+    """Fields of an index document a model is built from, for `_source` filtering."""
+    return list(model_class.model_fields)
+
+
+def normalize_query(query: str) -> str:
+    """Canonical form of a full text query, shared by equivalent spellings.
+
+    Only Unicode compatibility forms and runs of whitespace are folded, case is
+    kept: a `multi_match` without `fields` also searches keyword fields (genres,
+    raw titles), which match case sensitively. The normalized query is the one
+    sent to Elasticsearch, so a cache key never stands for different results.
+    """
+    return " ".join(unicodedata.normalize("NFKC", query).split())
+
+
+# Soft expiry timestamp and fetch duration stored in front of every value.
+ENTRY_HEADER = struct.Struct(">dd")
+
+
+def pack_entry(data: bytes, expire: int, fetch_duration: float) -> bytes:
+    return ENTRY_HEADER.pack(time.time() + expire, fetch_duration) + data
+
+
+# Payload of a negative entry, codecs never produce an empty payload.
+MISSING = b""
+
+
+def unpack_entry(data: bytes) -> tuple[float, float, bytes]:
+    soft_expires_at, fetch_duration = ENTRY_HEADER.unpack_from(data)
+    header_size = ENTRY_HEADER.size
+    return soft_expires_at, fetch_duration, data[header_size:]
+
+
+def stale_copy_key(cache_key: str) -> str:
+    return f"stale:{cache_key}"
+
+
+# Failures of a fetch on which the stale copy of the entry is served instead.
+BACKEND_ERRORS = (ApiError, TransportError, CircuitOpen, DeadlineExceeded)
+
+_refreshing: set[str] = set()
+
+
+class BaseService:
+    """Common read-through caching for services backed by Redis and Elasticsearch."""
+
+    namespace: str = ""
+    # Namespaces whose list entries embed data of this entity type.
+    dependent_namespaces: tuple[str, ...] = ()
+
+    def __init__(self, redis: Redis, elastic: AsyncElasticsearch):
+        self.redis = redis
+        self.elastic = elastic
+        self.cache_keys = CacheKeyBuilder(redis, self.namespace)
+
+    async def _get_or_fetch(
+        self,
+        cache_key: str,
+        fetch: Callable[[], Awaitable[Any]],
+        load: Callable[[bytes], Any],
+        dump: Callable[[Any], bytes],
+        expire: int,
+        cache_missing: bool = False,
+    ) -> Any:
+        """Return a cached value or fetch it once for all concurrent callers.
+
+        `expire` is the soft TTL of the entry. With `cache_missing` a `None`
+        result is cached too, for `negative_cache_expire_in_seconds`.
+        """
+        l1 = get_l1_cache(self.namespace)
+        if l1 is not None:
+            value = l1.get(cache_key)
+            if value is not None:
+                counters.inc("l1_cache_hits_total", namespace=self.namespace)
+                return value
+            counters.inc("l1_cache_misses_total", namespace=self.namespace)
+
+        check_deadline("redis")
+        data = await self.redis.get(cache_key)
+        self._count_lookups(cache_key, hits=1 if data else 0, misses=0 if data else 1)
+        if data:
+            soft_expires_at, fetch_duration, payload = unpack_entry(data)
+            value = self._load_entry(payload, load)
+            # Past the soft TTL, or early for hot keys, the entry is still served
+            # while a background task refreshes it.
+            if self._should_refresh(soft_expires_at, fetch_duration):
+                self._refresh_in_background(
+                    cache_key, fetch, dump, expire, cache_missing
+                )
+        else:
+            # The request waits for the rest of its budget only. The shared fetch
+            # is not cancelled then and still fills the cache for the others.
+            try:
+                value = await within_deadline(
+                    lambda: single_flight.do(
+                        cache_key,
+                        lambda: self._fill_cache(
+                            cache_key, fetch, load, dump, expire, cache_missing
+                        ),
+                        namespace=self.namespace,
+                    ),
+                    "elasticsearch",
+                )
+            except BACKEND_ERRORS:
+                # Elasticsearch failed, was too slow or the breaker is open:
+                # serve the stale copy, the response gets `X-Served-Stale`.
+                data = await self.redis.get(stale_copy_key(cache_key))
+                if not data:
+                    raise
+                self._count_stale_copies(cache_key, 1)
+                return load(unpack_entry(data)[2])
+
+        if l1 is not None and value is not None:
+            l1.set(cache_key, value, expire)
+        return value
+
+    async def _get_many(
+        self,
+        entity_ids: list,
+        fetch_many: Callable[[list[str]], Awaitable[dict[str, Any]]],
+        load: Callable[[bytes], Any],
+        dump: Callable[[Any], bytes],
+        expire: int,
+    ) -> list:
+        """Return many entities by id, in order and with None for missing ones.
+
+        Cached entities are read with one MGET. `fetch_many` loads all the
+        others at once and returns them by id; they are written back with one
+        pipeline, missing ids as negative entries.
+        """
+        unique_ids = list(dict.fromkeys(str(entity_id) for entity_id in entity_ids))
+        keys = {
+            entity_id: await self.cache_keys.detail(entity_id)
+            for entity_id in unique_ids
+        }
+        values = {}
+        pending = unique_ids
+        l1 = get_l1_cache(self.namespace)
+        if l1 is not None:
+            values = {entity_id: l1.get(keys[entity_id]) for entity_id in unique_ids}
+            pending = [
+                entity_id for entity_id in unique_ids if values[entity_id] is None
+            ]
+            counters.inc(
+                "l1_cache_hits_total",
+                len(unique_ids) - len(pending),
+                namespace=self.namespace,
+            )
+            counters.inc(
+                "l1_cache_misses_total", len(pending), namespace=self.namespace
+            )
+
+        async def fetch_one(entity_id):
+            return (await fetch_many([entity_id])).get(entity_id)
+
+        misses = []
+        cached = []
+        if pending:
+            check_deadline("redis")
+            cached = await self.redis.mget([keys[entity_id] for entity_id in pending])
+        for entity_id, data in zip(pending, cached):
+            if not data:
+                misses.append(entity_id)
+                continue
+            soft_expires_at, fetch_duration, payload = unpack_entry(data)
+            values[entity_id] = self._load_entry(payload, load)
+            if self._should_refresh(soft_expires_at, fetch_duration):
+                self._refresh_in_background(
+                    keys[entity_id], partial(fetch_one, entity_id), dump, expire, True
+                )
+
+        if pending:
+            self._count_lookups(
+                keys[pending[0]], hits=len(pending) - len(misses), misses=len(misses)
+            )
+        if misses:
+            started = time.perf_counter()
+            try:
+                found = await within_deadline(
+                    lambda: self._call_elastic(partial(fetch_many, misses)),
+                    "elasticsearch",
+                )
+            except BACKEND_ERRORS:
+                stale = await self.redis.mget(
+                    [stale_copy_key(keys[entity_id]) for entity_id in misses]
+                )
+                if not all(stale):
+                    raise
+                self._count_stale_copies(keys[misses[0]], len(misses))
+                for entity_id, data in zip(misses, stale):
+                    values[entity_id] = load(unpack_entry(data)[2])
+                return [values[str(entity_id)] for entity_id in entity_ids]
+            fetch_duration = time.perf_counter() - started
+            negative_expire = settings.negative_cache_expire_in_seconds
+            entries = []
+            for entity_id in misses:
+                value = values[entity_id] = found.get(entity_id)
+                if value is not None:
+                    data = pack_entry(dump(value), expire, fetch_duration)
+                    hard_expire = (
+                        expire + settings.cache_stale_while_revalidate_in_seconds
+                    )
+                    entries.append((keys[entity_id], data, hard_expire))
+                elif negative_expire:
+                    data = pack_entry(MISSING, negative_expire, fetch_duration)
+                    entries.append((keys[entity_id], data, negative_expire))
+            await self._put_many(entries)
+
+        if l1 is not None:
+            for entity_id in pending:
+                if values[entity_id] is not None:
+                    l1.set(keys[entity_id], values[entity_id], expire)
+        return [values[str(entity_id)] for entity_id in entity_ids]
+
+    def _count_lookups(self, cache_key: str, hits: int, misses: int):
+        # Keys look like v3:film:0.0.0:detail:<id>, see CacheKeyBuilder.
+        kind = cache_key.split(":", 4)[3]
+        if hits:
+            counters.inc("cache_hits_total", hits, namespace=self.namespace, kind=kind)
+        if misses:
+            counters.inc(
+                "cache_misses_total", misses, namespace=self.namespace, kind=kind
+            )
+
+    def _count_stale_copies(self, cache_key: str, served: int):
+        counters.inc("stale_copies_served_total", served, namespace=self.namespace)
+        mark_stale(cache_key)
+
+    async def _call_elastic(self, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        if not settings.circuit_breaker_enabled:
+            return await fetch()
+        return await elastic_breaker.call(fetch)
+
+    def _load_entry(self, payload: bytes, load: Callable[[bytes], Any]) -> Any:
+        if payload == MISSING:
+            counters.inc("negative_cache_hits_total", namespace=self.namespace)
+            return None
+        return load(payload)
+
+    async def _fill_cache(
+        self, cache_key, fetch, load, dump, expire, cache_missing
+    ) -> Any:
+        if not settings.cache_lock_enabled:
+            return await self._fetch_and_put(
+                cache_key, fetch, dump, expire, cache_missing
+            )
+
+        # Other workers wait for the value instead of querying Elasticsearch.
+        lock = self.redis.lock(
+            f"lock:{cache_key}",
+            timeout=settings.cache_lock_timeout_in_seconds,
+            blocking=False,
+        )
+        if await lock.acquire():
+            try:
+                return await self._fetch_and_put(
+                    cache_key, fetch, dump, expire, cache_missing
+                )
+            finally:
+                try:
+                    await lock.release()
+                except LockError:
+                    logger.warning(
+                        "Cache lock for %s expired before release", cache_key
+                    )
+
+        counters.inc("singleflight_lock_waits_total", namespace=self.namespace)
+        data = await self._wait_for_lock_holder(cache_key, lock.name)
+        if data:
+            counters.inc(
+                "singleflight_remote_coalesced_total", namespace=self.namespace
+            )
+            return self._load_entry(unpack_entry(data)[2], load)
+        return await self._fetch_and_put(cache_key, fetch, dump, expire, cache_missing)
+
+    async def _wait_for_lock_holder(
+        self, cache_key: str, lock_key: str
+    ) -> bytes | None:
+        """Poll until another worker has cached the value or released its lock."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.cache_lock_timeout_in_seconds
+        while loop.time() < deadline:
+            await asyncio.sleep(settings.cache_lock_poll_interval_in_seconds)
+            data, lock_token = await self.redis.mget(cache_key, lock_key)
+            if data or not lock_token:
+                return data
+        return None
+
+    def _should_refresh(self, soft_expires_at: float, fetch_duration: float) -> bool:
+        now = time.time()
+        if now >= soft_expires_at:
+            counters.inc("cache_stale_hits_total", namespace=self.namespace)
+            return True
+        beta = settings.cache_refresh_ahead_beta
+        # XFetch: the closer the expiry and the slower the fetch, the likelier
+        # a request refreshes early; hot keys get there long before cold ones.
+        if beta <= 0:
+            return False
+        if (
+            now - fetch_duration * beta * math.log(1 - random.random())
+            < soft_expires_at
+        ):
+            return False
+        counters.inc("cache_refresh_ahead_total", namespace=self.namespace)
+        return True
+
+    def _refresh_in_background(self, cache_key, fetch, dump, expire, cache_missing):
+        if cache_key in _refreshing:
+            return
+        _refreshing.add(cache_key)
+        # A fresh context: the refresh is not part of the request that
+        # started it, neither of its deadline nor of its circuit breaker call.
+        task = asyncio.create_task(
+            self._refresh(cache_key, fetch, dump, expire, cache_missing),
+            context=contextvars.Context(),
+        )
+        task.add_done_callback(lambda _: _refreshing.discard(cache_key))
+
+    async def _refresh(self, cache_key, fetch, dump, expire, cache_missing):
+        # Only one worker refreshes an entry, the others keep serving it.
+        claimed = await self.redis.set(
+            f"refresh:{cache_key}",
+            1,
+            nx=True,
+            ex=math.ceil(settings.cache_lock_timeout_in_seconds),
+        )
+        if not claimed:
+            return
+        counters.inc("cache_background_refreshes_total", namespace=self.namespace)
+        try:
+            await single_flight.do(
+                cache_key,
+                lambda: self._fetch_and_put(
+                    cache_key, fetch, dump, expire, cache_missing
+                ),
+                namespace=self.namespace,
+            )
+        except CircuitOpen:
+            logger.debug("Background refresh of %s skipped, circuit open", cache_key)
+        except Exception:
+            logger.exception("Background refresh of %s failed", cache_key)
+
+    async def _fetch_and_put(
+        self, cache_key, fetch, dump, expire, cache_missing=False
+    ) -> Any:
+        started = time.perf_counter()
+        value = await self._call_elastic(fetch)
+        fetch_duration = time.perf_counter() - started
+        if value is not None:
+            await self._put(
+                cache_key, pack_entry(dump(value), expire, fetch_duration), expire
+            )
+        elif cache_missing and settings.negative_cache_expire_in_seconds:
+            counters.inc("negative_cache_misses_total", namespace=self.namespace)
+            negative_expire = settings.negative_cache_expire_in_seconds
+            # Not served stale: the entity may be loaded in the meantime.
+            await self._put(
+                cache_key,
+                pack_entry(MISSING, negative_expire, fetch_duration),
+                negative_expire,
+                stale_expire=0,
+            )
+        return value
+
+    async def _put(
+        self,
+        cache_key: str,
+        data: bytes,
+        expire: int,
+        stale_expire: int | None = None,
+    ):
+        if stale_expire is None:
+            stale_expire = settings.cache_stale_while_revalidate_in_seconds
+        hard_expire = expire + stale_expire
+        if (
+            get_l1_cache(self.namespace) is None
+            and not settings.stale_copy_expire_in_seconds
+        ):
+            counters.inc("cache_sets_total", namespace=self.namespace)
+            await self.redis.set(cache_key, data, hard_expire)
+            return
+        await self._put_many([(cache_key, data, hard_expire)])
+
+    async def _put_many(self, entries: list[tuple[str, bytes, int]]):
+        """Write entries given as (key, data, expire) in one round trip.
+
+        Entries other than negative ones are written a second time as their
+        long-lived stale copy.
+        """
+        if not entries:
+            return
+        counters.inc("cache_sets_total", len(entries), namespace=self.namespace)
+        l1 = get_l1_cache(self.namespace)
+        stale_expire = settings.stale_copy_expire_in_seconds
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for cache_key, data, expire in entries:
+                pipe.set(cache_key, data, expire)
+                if stale_expire and len(data) > ENTRY_HEADER.size:
+                    pipe.set(stale_copy_key(cache_key), data, max(stale_expire, expire))
+                if l1 is not None:
+                    publish_invalidation(pipe, self.namespace, cache_key)
+            await pipe.execute()
+
+    async def invalidate_entity(self, entity_id):
+        """Drop one entity together with every list page that may contain it.
+
+        List pages of `dependent_namespaces` are dropped as well. Their detail
+        entries are kept, they are expected to hold only ids of this entity.
+        """
+        await self.invalidate(await self.cache_keys.detail(entity_id))
+        for namespace in (self.namespace, *self.dependent_namespaces):
+            await bump_generation(self.redis, namespace, lists=True)
+
+    async def invalidate_namespace(self):
+        await bump_generation(self.redis, self.namespace)
+
+    async def invalidate(self, cache_key: str):
+        """Delete a cache entry here and drop its L1 copies in every worker."""
+        l1 = get_l1_cache(self.namespace)
+        if l1 is None:
+            await self.redis.delete(cache_key)
+            return
+
+        l1.delete(cache_key)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.delete(cache_key)
+            publish_invalidation(pipe, self.namespace, cache_key)
+            await pipe.execute()
+
+    async def _scan(
+        self, index: str, batch_size: int, fields: list[str] | None = None
+    ) -> AsyncIterator[list[dict]]:
+        """Walk a whole index in batches of `_source` documents.
+
+        The walk is pinned to a point in time and paged with search_after on
+        `_shard_doc`, so memory stays bounded by one batch and the next batch is
+        requested only when the consumer asks for it.
+        """
+        pit = await self.elastic.open_point_in_time(
+            index=index, keep_alive=settings.pit_keep_alive
+        )
+        pit_id = pit["id"]
+        search_after = None
+        try:
+            while True:
+                body = {
+                    "query": {"match_all": {}},
+                    "sort": ["_shard_doc"],
+                    "size": batch_size,
+                    "track_total_hits": False,
+                    "pit": {"id": pit_id, "keep_alive": settings.pit_keep_alive},
+                }
+                if fields:
+                    body["_source"] = fields
+                if search_after is not None:
+                    body["search_after"] = search_after
+
+                response = await self.elastic.search(body=body)
+                hits = response["hits"]["hits"]
+                pit_id = response.get("pit_id", pit_id)
+                if hits:
+                    yield [hit["_source"] for hit in hits]
+                if len(hits) < batch_size:
+                    return
+                search_after = hits[-1]["sort"]
+        finally:
+            await self.elastic.close_point_in_time(id=pit_id)
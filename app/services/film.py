@@ -1,138 +1,245 @@
-import hashlib
-import json
 import logging
 from functools import lru_cache
 from uuid import UUID
 
+from core.codec import dump_model, load_model
 from core.config import settings
+from core.metrics import counters
 from db.elastic import get_elastic
 from db.redis import get_redis
-from elasticsearch import AsyncElasticsearch, NotFoundError
+from elasticsearch import AsyncElasticsearch, BadRequestError, NotFoundError
 from fastapi import Depends
-from models.film import Film, FilmDetail
+from models.film import Film, FilmDetail, FilmPage
 from redis.asyncio import Redis
+from services import pagination
+from services.base import BaseService, normalize_query, source_fields
+from services.genre_catalog import genre_catalog
 
 logger = logging.getLogger(__name__)
 
+FILM_FIELDS = source_fields(Film)
+# Denormalized names are only used for full text search.
+FILM_DETAIL_EXCLUDES = ["actors_names", "writers_names", "directors_names"]
 
-class FilmService:
-    def __init__(self, redis: Redis, elastic: AsyncElasticsearch):
-        self.redis = redis
-        self.elastic = elastic
 
-    async def get_by_id(self, film_id: UUID) -> FilmDetail | None:
-        film = await self._film_from_cache(film_id)
-        if not film:
-            film = await self._get_film_from_elastic(film_id)
-            if not film:
-                return None
-            await self._put_film_to_cache(film)
-
-        return film
+class FilmService(BaseService):
+    namespace = "film"
+    # Filmographies and person search results show film titles and ratings.
+    dependent_namespaces = ("person",)
 
-    def _generate_cache_key(self, sort, genre, page_size, page_number):
-        key_str = f"films:{sort}:{genre}:{page_size}:{page_number}"
-        return hashlib.md5(key_str.encode()).hexdigest()
+    async def get_by_id(self, film_id: UUID) -> FilmDetail | None:
+        return await self._get_or_fetch(
+            await self.cache_keys.detail(film_id),
+            lambda: self._get_film_from_elastic(film_id),
+            load=load_model(FilmDetail),
+            dump=dump_model,
+            expire=settings.film_cache_expire_in_seconds,
+            cache_missing=True,
+        )
 
-    async def get_list(self, sort, genre, page_size, page_number):
-        cache_key = self._generate_cache_key(sort, genre, page_size, page_number)
+    async def get_list(
+        self, sort, genre, page_size, page_number, cursor: str | None = None
+    ) -> FilmPage | None:
+        if cursor is None:
+            pagination.check_offset(page_size, page_number)
+        cache_key = await self.cache_keys.list(
+            "list", sort, genre, page_size, page_number, cursor
+        )
 
-        cached_data = await self.redis.get(cache_key)
-        if cached_data:
-            return [Film.parse_raw(film) for film in json.loads(cached_data)]
+        return await self._get_or_fetch(
+            cache_key,
+            lambda: self._get_films_from_elastic(
+                sort, genre, page_size, page_number, cursor
+            ),
+            load=load_model(FilmPage),
+            dump=dump_model,
+            expire=settings.film_cache_expire_in_seconds,
+        )
 
+    async def _get_films_from_elastic(
+        self, sort, genre, page_size, page_number, cursor
+    ) -> FilmPage | None:
         query = {"match_all": {}}
-        logger.debug(
-            f"Search type {sort}",
-        )
+        logger.debug("Search type %s", sort)
         sort_type = "asc"
         if sort and sort[0].startswith("-"):
             sort_type = "desc"
 
         if genre:
-            genre_response = await self.elastic.search(
-                index="genres", query={"multi_match": {"query": genre}}
-            )
-            genre_names = " ".join(
-                [genre["_source"]["name"] for genre in genre_response["hits"]["hits"]]
+            genre_name = await self._get_genre_name(genre)
+            logger.debug("Genre %s is %s", genre, genre_name)
+            if genre_name is None:
+                return FilmPage(films=[])
+            query = {"bool": {"filter": [{"term": {"genres": genre_name}}]}}
+
+        return await self._search_page(
+            query,
+            [{"imdb_rating": {"order": sort_type}}, {"id": {"order": sort_type}}],
+            page_size,
+            page_number,
+            cursor,
+        )
+
+    async def search_film(
+        self, query, page_size, page_number, cursor: str | None = None
+    ) -> FilmPage | None:
+        if cursor is None:
+            pagination.check_offset(page_size, page_number)
+        query = normalize_query(query)
+        cache_key = await self.cache_keys.list(
+            "search", query, page_size, page_number, cursor
+        )
+        counters.inc("search_cache_requests_total", namespace=self.namespace)
+
+        async def fetch():
+            counters.inc("search_cache_misses_total", namespace=self.namespace)
+            return await self._search_page(
+                {"multi_match": {"query": query}},
+                [{"_score": {"order": "desc"}}, {"id": {"order": "asc"}}],
+                page_size,
+                page_number,
+                cursor,
             )
 
-            logger.debug(f"Genre list {genre_names}")
+        return await self._get_or_fetch(
+            cache_key,
+            fetch,
+            load=load_model(FilmPage),
+            dump=dump_model,
+            expire=settings.search_cache_expire_in_seconds,
+        )
 
-            if genre_names:
-                query = {"bool": {"must": [{"term": {"genres": genre_names}}]}}
+    async def _search_page(
+        self, query, sort, page_size, page_number, cursor, use_pit=True
+    ) -> FilmPage | None:
+        """Fetch one page of films either by offset or after a cursor.
 
-        offset = (page_number - 1) * page_size
+        The last hit's sort values are returned as the next cursor, so each
+        following page costs the same as the first one. With `films_pit_enabled`
+        the walk is pinned to a point in time opened on its first page.
+        """
+        search_after, pit_id = (
+            pagination.decode_cursor(cursor) if cursor else (None, None)
+        )
+        if use_pit and settings.films_pit_enabled and not cursor and page_number == 1:
+            pit = await self.elastic.open_point_in_time(
+                index="movies", keep_alive=settings.pit_keep_alive
+            )
+            pit_id = pit["id"]
+        use_pit = use_pit and bool(pit_id)
 
+        body = {
+            "query": query,
+            "sort": sort,
+            "size": page_size,
+            "_source": FILM_FIELDS,
+        }
+        if search_after is not None:
+            # The `_shard_doc` tiebreaker only exists inside the point in time.
+            body["search_after"] = search_after if use_pit else search_after[:2]
+        else:
+            body["from"] = (page_number - 1) * page_size
         try:
-            films_list = await self.elastic.search(
-                index="movies",
-                body={
-                    "query": query,
-                    "sort": [{"imdb_rating": {"order": sort_type}}],
-                    "from": offset,
-                    "size": page_size,
-                },
-            )
-            logger.debug(f"Retrieved films {films_list}")
+            if use_pit:
+                body["pit"] = {"id": pit_id, "keep_alive": settings.pit_keep_alive}
+                films_list = await self.elastic.search(body=body)
+            else:
+                films_list = await self.elastic.search(index="movies", body=body)
+            logger.debug("Retrieved films %s", films_list)
+        except BadRequestError:
+            if not cursor:
+                raise
+            # E.g. a point in time id Elasticsearch cannot parse.
+            raise pagination.PaginationError("Invalid cursor")
         except NotFoundError:
-            return None
+            if not use_pit:
+                return None
+            logger.info("Point in time expired, continuing on the live index")
+            return await self._search_page(
+                query, sort, page_size, page_number, cursor, use_pit=False
+            )
 
-        films = [Film(**get_film["_source"]) for get_film in films_list["hits"]["hits"]]
-        await self.redis.set(
-            cache_key,
-            json.dumps([film.json() for film in films]),
-            settings.film_cache_expire_in_seconds,
+        hits = films_list["hits"]["hits"]
+        if use_pit:
+            pit_id = films_list.get("pit_id", pit_id)
+        next_cursor = None
+        if len(hits) == page_size:
+            next_cursor = pagination.encode_cursor(
+                hits[-1]["sort"], pit_id if use_pit else None
+            )
+        elif use_pit:
+            # The last page. Walks stopped earlier leave their point in time to
+            # expire after `pit_keep_alive`.
+            await self._close_point_in_time(pit_id)
+        return FilmPage(
+            films=[Film(**get_film["_source"]) for get_film in hits],
+            next_cursor=next_cursor,
         )
 
-        return films
+    async def _close_point_in_time(self, pit_id: str):
+        try:
+            await self.elastic.close_point_in_time(id=pit_id)
+        except NotFoundError:
+            pass
+
+    async def get_many(self, film_ids: list) -> list[FilmDetail | None]:
+        return await self._get_many(
+            film_ids,
+            self._get_films_by_ids,
+            load=load_model(FilmDetail),
+            dump=dump_model,
+            expire=settings.film_cache_expire_in_seconds,
+        )
 
-    async def search_film(self, query, page_size, page_number):
-        offset = (page_number - 1) * page_size
+    async def _get_films_by_ids(self, film_ids: list[str]) -> dict[str, FilmDetail]:
         try:
-            films_list = await self.elastic.search(
-                index="movies",
-                from_=offset,
-                size=page_size,
-                query={"multi_match": {"query": query}},
+            response = await self.elastic.mget(
+                index="movies", ids=film_ids, source_excludes=FILM_DETAIL_EXCLUDES
             )
         except NotFoundError:
-            return None
-        logger.debug(f"Searched films {films_list}")
-        return [Film(**get_film["_source"]) for get_film in films_list["hits"]["hits"]]
+            return {}
+        docs = [doc for doc in response["docs"] if doc.get("found")]
+        genres = await self._get_genres_by_names(
+            [name for doc in docs for name in doc["_source"].get("genres", [])]
+        )
+        return {
+            doc["_id"]: self._build_film_detail(doc["_source"], genres) for doc in docs
+        }
 
     async def _get_film_from_elastic(self, film_id: UUID) -> FilmDetail | None:
         try:
-            doc = await self.elastic.get(index="movies", id=film_id)
-            genres = doc["_source"].get("genres", [])
-            logger.debug(f"genres list: {genres}")
-            genres_list = []
-            for genre in genres:
-                response = await self.elastic.search(
-                    index="genres", query={"multi_match": {"query": genre}}
-                )
-
-                genres_list.append(response["hits"]["hits"][0]["_source"])
-            actors = doc["_source"].get("actors", [])
-            if isinstance(actors, str):
-                actors = []
-
-            writers = doc["_source"].get("writers", [])
-            if isinstance(writers, str):
-                writers = []
-
-            directors = doc["_source"].get("directors", [])
-            if isinstance(directors, str):
-                directors = []
+            doc = await self.elastic.get(
+                index="movies", id=film_id, source_excludes=FILM_DETAIL_EXCLUDES
+            )
         except NotFoundError:
-            logger.error(f"Film with ID {film_id} not found in Elasticsearch")
+            logger.info("Film with ID %s not found in Elasticsearch", film_id)
             return None
+        source = doc["_source"]
+        genres = await self._get_genres_by_names(source.get("genres", []))
+        return self._build_film_detail(source, genres)
+
+    def _build_film_detail(self, source: dict, genres: dict) -> FilmDetail:
+        """Build the film from its document and the genres found by name."""
+        names = source.get("genres", [])
+        logger.debug("genres list: %s", names)
+        genres_list = [genres[name] for name in names if name in genres]
+        actors = source.get("actors", [])
+        if isinstance(actors, str):
+            actors = []
+
+        writers = source.get("writers", [])
+        if isinstance(writers, str):
+            writers = []
+
+        directors = source.get("directors", [])
+        if isinstance(directors, str):
+            directors = []
 
         film_data = {
-            "id": doc["_source"].get("id"),
-            "title": doc["_source"].get("title"),
-            "imdb_rating": doc["_source"].get("imdb_rating"),
-            "description": doc["_source"].get("description", ""),
+            "id": source.get("id"),
+            "title": source.get("title"),
+            "imdb_rating": source.get("imdb_rating"),
+            "description": source.get("description", ""),
             "genres": genres_list,
             "actors": [
                 {"id": actor.get("id"), "full_name": actor.get("name")}
@@ -150,21 +257,58 @@ class FilmService:
                 if isinstance(director, dict)
             ],
         }
-        logger.debug("Got film details {film_data}")
+        logger.debug("Got film details %s", film_data)
         return FilmDetail(**film_data)
 
-    async def _film_from_cache(self, film_id: UUID) -> Film | None:
-        data = await self.redis.get(str(film_id))
-        if not data:
+    async def _get_genre_name(self, genre_id) -> str | None:
+        catalog = await genre_catalog.get(self.elastic, self.redis)
+        genre = catalog.by_id(genre_id) if catalog else None
+        if genre is not None:
+            return genre.name
+        try:
+            doc = await self.elastic.get(
+                index="genres", id=genre_id, source_includes=["name"]
+            )
+        except NotFoundError:
             return None
-        logger.debug(f"Retrieved film {film_id} from cache")
-        film = Film.parse_raw(data)
-        return film
+        return doc["_source"]["name"]
 
-    async def _put_film_to_cache(self, film: Film):
-        await self.redis.set(
-            str(film.id), film.json(), settings.film_cache_expire_in_seconds
-        )
+    async def _get_genres_by_names(self, names: list[str]) -> dict:
+        """Resolve genre names of one or more films from the catalog.
+
+        Names missing from it are resolved with a single msearch round trip,
+        names that are not found are left out.
+        """
+        catalog = await genre_catalog.get(self.elastic, self.redis)
+        genres = {name: catalog.by_name(name) if catalog else None for name in names}
+        missing = [name for name, genre in genres.items() if genre is None]
+        if missing:
+            found = await self._search_genres_by_names(missing)
+            genres.update(zip(missing, found))
+        return {name: genre for name, genre in genres.items() if genre is not None}
+
+    async def _search_genres_by_names(self, names: list[str]) -> list[dict | None]:
+        searches = []
+        for name in names:
+            searches.append({"index": "genres"})
+            searches.append(
+                {
+                    "query": {"multi_match": {"query": name}},
+                    "size": 1,
+                    "_source": ["id", "name"],
+                }
+            )
+        response = await self.elastic.msearch(searches=searches)
+
+        return [
+            result["hits"]["hits"][0]["_source"]
+            if result.get("hits", {}).get("hits")
+            else None
+            for result in response["responses"]
+        ]
+
+    def export(self, batch_size: int, fields: list[str] | None = None):
+        return self._scan("movies", batch_size, fields)
 
 
 @lru_cache()
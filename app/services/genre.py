@@ -1,8 +1,8 @@
-import json
 import logging
 from functools import lru_cache
 from uuid import UUID
 
+from core.codec import dump_model, dump_models, load_model, load_models
 from core.config import settings
 from db.elastic import get_elastic
 from db.redis import get_redis
@@ -10,39 +10,73 @@ from elasticsearch import AsyncElasticsearch, NotFoundError
 from fastapi import Depends
 from models.genre import Genre
 from redis.asyncio import Redis
+from services.base import BaseService
+from services.genre_catalog import genre_catalog
 
 logger = logging.getLogger(__name__)
 
 
-class GenreService:
-    def __init__(self, redis: Redis, elastic: AsyncElasticsearch):
-        self.redis = redis
-        self.elastic = elastic
-
-    def _generate_cache_key(self, genre_id):
-        return f"genre:{genre_id}"
+class GenreService(BaseService):
+    namespace = "genre"
 
     async def get_by_id(self, genre_id: UUID) -> Genre | None:
-        cache_key = self._generate_cache_key(genre_id)
-        cached_data = await self.redis.get(cache_key)
-        if cached_data:
-            return Genre.parse_raw(cached_data)
-
-        genre = await self._get_genre_from_elastic(genre_id)
-        if genre:
-            await self.redis.set(
-                cache_key, genre.json(), settings.genre_cache_expire_in_seconds
-            )
+        catalog = await genre_catalog.get(self.elastic, self.redis)
+        genre = catalog.by_id(genre_id) if catalog else None
+        if genre is not None:
+            return genre
+        # Not in the catalog (yet), e.g. added after its last refresh.
+        return await self._get_or_fetch(
+            await self.cache_keys.detail(genre_id),
+            lambda: self._get_genre_from_elastic(genre_id),
+            load=load_model(Genre),
+            dump=dump_model,
+            expire=settings.genre_cache_expire_in_seconds,
+            cache_missing=True,
+        )
 
-        return genre
+    async def get_many(self, genre_ids: list) -> list[Genre | None]:
+        catalog = await genre_catalog.get(self.elastic, self.redis)
+        genres = [
+            catalog.by_id(genre_id) if catalog else None for genre_id in genre_ids
+        ]
+        if all(genres):
+            return genres
+        return await self._get_many(
+            genre_ids,
+            self._get_genres_by_ids,
+            load=load_model(Genre),
+            dump=dump_model,
+            expire=settings.genre_cache_expire_in_seconds,
+        )
+
+    async def _get_genres_by_ids(self, genre_ids: list[str]) -> dict[str, Genre]:
+        try:
+            response = await self.elastic.mget(index="genres", ids=genre_ids)
+        except NotFoundError:
+            return {}
+        return {
+            doc["_id"]: Genre(id=doc["_source"]["id"], name=doc["_source"]["name"])
+            for doc in response["docs"]
+            if doc.get("found")
+        }
 
     async def get_list(self, page_number, page_size):
-        cache_key = f"genres_list:{page_size}:{page_number}"
-        cached_data = await self.redis.get(cache_key)
-        offset = (page_number - 1) * page_size
-        if cached_data:
-            return [Genre.parse_raw(genre) for genre in json.loads(cached_data)]
+        catalog = await genre_catalog.get(self.elastic, self.redis)
+        if catalog is not None:
+            return catalog.page(page_number, page_size)
+
+        cache_key = await self.cache_keys.list("list", page_size, page_number)
 
+        return await self._get_or_fetch(
+            cache_key,
+            lambda: self._get_genres_from_elastic(page_number, page_size),
+            load=load_models(Genre),
+            dump=dump_models,
+            expire=settings.genre_cache_expire_in_seconds,
+        )
+
+    async def _get_genres_from_elastic(self, page_number, page_size):
+        offset = (page_number - 1) * page_size
         try:
             genres_list = await self.elastic.search(
                 index="genres", from_=offset, size=page_size, query={"match_all": {}}
@@ -50,16 +84,9 @@ class GenreService:
         except NotFoundError:
             return None
 
-        genres = [
+        return [
             Genre(**get_genre["_source"]) for get_genre in genres_list["hits"]["hits"]
         ]
-        await self.redis.set(
-            cache_key,
-            json.dumps([genre.json() for genre in genres]),
-            settings.genre_cache_expire_in_seconds,
-        )
-
-        return genres
 
     async def _get_genre_from_elastic(self, genre_id: UUID) -> Genre | None:
         try:
@@ -71,18 +98,8 @@ class GenreService:
         answer["name"] = doc["_source"]["name"]
         return Genre(**answer)
 
-    async def _genre_from_cache(self, genre_id: UUID) -> Genre | None:
-        data = await self.redis.get(str(genre_id))
-        if not data:
-            return None
-        logger.info(f"Retrieved genre {genre_id} from cache")
-        genre = Genre.parse_raw(data)
-        return genre
-
-    async def _put_genre_to_cache(self, genre: Genre):
-        await self.redis.set(
-            str(genre.id), genre.json(), settings.genre_cache_expire_in_seconds
-        )
+    def export(self, batch_size: int, fields: list[str] | None = None):
+        return self._scan("genres", batch_size, fields)
 
 
 @lru_cache()
@@ -0,0 +1,89 @@
+import logging
+import time
+
+from core.cache_keys import generation_key, generations
+from core.config import settings
+from core.singleflight import single_flight
+from elasticsearch import ApiError, AsyncElasticsearch, TransportError
+from models.genre import Genre
+from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+
+class GenreCatalog:
+    """Per-process copy of the genres index with id and name lookups.
+
+    The index holds a few dozen documents, so it is read whole and re-read at
+    most every `genre_catalog_refresh_interval_in_seconds`, or as soon as the
+    global or genre cache generation is bumped. Genres are kept in index
+    order, the order `match_all` lists them in.
+    """
+
+    def __init__(self):
+        self._by_id: dict[str, Genre] = {}
+        self._by_name: dict[str, Genre] = {}
+        self._expires_at = 0.0
+        self._generation: tuple[int, ...] | None = None
+
+    @property
+    def loaded(self) -> bool:
+        return bool(self._by_id)
+
+    async def get(
+        self, elastic: AsyncElasticsearch, redis: Redis
+    ) -> "GenreCatalog | None":
+        """Return the catalog, refreshed if due, or None when it is unavailable."""
+        if (
+            time.monotonic() >= self._expires_at
+            or await self._current_generation(redis) != self._generation
+        ):
+            await single_flight.do(
+                "catalog", lambda: self.refresh(elastic, redis), namespace="genre"
+            )
+        return self if self.loaded else None
+
+    async def refresh(self, elastic: AsyncElasticsearch, redis: Redis):
+        # A failed refresh keeps serving the previous copy until the next one.
+        self._generation = await self._current_generation(redis)
+        self._expires_at = (
+            time.monotonic() + settings.genre_catalog_refresh_interval_in_seconds
+        )
+        try:
+            response = await elastic.search(
+                index="genres",
+                query={"match_all": {}},
+                size=settings.max_result_window,
+                source=["id", "name"],
+            )
+        except (ApiError, TransportError) as error:
+            logger.warning("Genre catalog was not refreshed: %s", error)
+            return
+
+        genres = [Genre(**hit["_source"]) for hit in response["hits"]["hits"]]
+        self._by_id = {str(genre.id): genre for genre in genres}
+        self._by_name = {genre.name: genre for genre in genres}
+        logger.debug("Genre catalog loaded %s genres", len(genres))
+
+    @staticmethod
+    async def _current_generation(redis: Redis) -> tuple[int, ...]:
+        values = await generations.get(redis)
+        return (
+            values[generation_key()],
+            values[generation_key("genre")],
+            values[generation_key("genre", lists=True)],
+        )
+
+    def by_id(self, genre_id) -> Genre | None:
+        return self._by_id.get(str(genre_id))
+
+    def by_name(self, name: str) -> Genre | None:
+        return self._by_name.get(name)
+
+    def page(self, page_number: int, page_size: int) -> list[Genre]:
+        start = (page_number - 1) * page_size
+        end = start + page_size
+        return list(self._by_id.values())[start:end]
+
+
+genre_catalog = GenreCatalog()
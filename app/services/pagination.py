@@ -0,0 +1,62 @@
+import base64
+import binascii
+
+import orjson
+from core.config import settings
+
+
+class PaginationError(ValueError):
+    pass
+
+
+def encode_cursor(search_after: list, pit_id: str | None = None) -> str:
+    """Pack the sort values of the last hit into an opaque url-safe token."""
+    payload = {"after": search_after}
+    if pit_id:
+        payload["pit"] = pit_id
+    return base64.urlsafe_b64encode(orjson.dumps(payload)).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[list, str | None]:
+    """Unpack a cursor of `encode_cursor`, checking it has the shape of the sorts.
+
+    Film pages are sorted by a numeric value (rating or score, null when
+    missing) and then by id. Searches in a point in time also return the
+    implicit `_shard_doc` tiebreaker, so `after` holds a third value then.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = orjson.loads(base64.urlsafe_b64decode(padded))
+        search_after = payload["after"]
+        pit_id = payload.get("pit")
+    except (binascii.Error, ValueError, TypeError, KeyError, AttributeError):
+        raise PaginationError("Invalid cursor")
+    if not (
+        (pit_id is None or isinstance(pit_id, str))
+        and isinstance(search_after, list)
+        and len(search_after) == (3 if pit_id else 2)
+        and _is_number(search_after[0])
+        and isinstance(search_after[1], str)
+        and all(_is_integer(value) for value in search_after[2:])
+    ):
+        raise PaginationError("Invalid cursor")
+    return search_after, pit_id
+
+
+def _is_number(value) -> bool:
+    return value is None or (
+        isinstance(value, (int, float)) and not isinstance(value, bool)
+    )
+
+
+def _is_integer(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def check_offset(page_size: int, page_number: int):
+    """Reject offset pages Elasticsearch would refuse to build."""
+    if page_size * page_number > settings.max_result_window:
+        raise PaginationError(
+            f"page_size * page_number must not exceed {settings.max_result_window}, "
+            "use the cursor parameter for deep pages"
+        )
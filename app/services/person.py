@@ -1,88 +1,163 @@
-import hashlib
-import json
 import logging
 from functools import lru_cache
 from uuid import UUID
 
+from core.codec import dump_model, dump_models, load_model, load_models
 from core.config import settings
 from db.elastic import get_elastic
 from db.redis import get_redis
 from elasticsearch import AsyncElasticsearch, NotFoundError
 from fastapi import Depends
 from models.film import Film
-from models.person import Person, PersonFilm
+from models.person import Filmography, FilmographyFilm, Person, PersonFilm
 from redis.asyncio import Redis
+from services.base import BaseService, normalize_query, source_fields
 
 logger = logging.getLogger(__name__)
 
-
-class PersonService:
-    def __init__(self, redis: Redis, elastic: AsyncElasticsearch):
-        self.redis = redis
-        self.elastic = elastic
-
-    def _generate_cache_key(self, query, page_number, page_size):
-        key_str = f"persons:{query}:{page_number}:{page_size}"
-        return hashlib.md5(key_str.encode()).hexdigest()
-
-    async def get_person_films(self, person_id: UUID):
-        film_list = await self.elastic.search(
-            index="movies",
-            query={
-                "bool": {
-                    "should": [
-                        {
-                            "nested": {
-                                "path": "directors",
-                                "query": {"term": {"directors.id": person_id}},
-                            },
-                        },
-                        {
-                            "nested": {
-                                "path": "actors",
-                                "query": {"term": {"actors.id": person_id}},
-                            },
-                        },
-                        {
-                            "nested": {
-                                "path": "writers",
-                                "query": {"term": {"writers.id": person_id}},
-                            }
+FILM_FIELDS = source_fields(Film)
+# Role of a person in a film by the nested field listing it.
+ROLES = {"director": "directors", "actor": "actors", "writer": "writers"}
+# Films of a filmography fetched per search, one page covers almost everyone.
+FILMOGRAPHY_PAGE_SIZE = 1000
+
+
+class PersonService(BaseService):
+    namespace = "person"
+
+    def _person_films_query(self, person_id) -> dict:
+        """Films of a person, each clause is named after the role it matches."""
+        return {
+            "bool": {
+                "should": [
+                    {
+                        "nested": {
+                            "path": path,
+                            "query": {"term": {f"{path}.id": str(person_id)}},
+                            "_name": role,
                         },
-                    ]
-                }
-            },
+                    }
+                    for role, path in ROLES.items()
+                ]
+            }
+        }
+
+    @staticmethod
+    def _roles(hit: dict) -> list[str]:
+        matched = hit.get("matched_queries") or []
+        return [role for role in ROLES if role in matched]
+
+    async def get_filmography(self, person_id) -> Filmography:
+        """All films of a person with their roles, shared by the person endpoints."""
+        return await self._get_or_fetch(
+            await self.cache_keys.list("filmography", person_id),
+            lambda: self._get_filmography_from_elastic(person_id),
+            load=load_model(Filmography),
+            dump=dump_model,
+            expire=settings.person_cache_expire_in_seconds,
         )
-        person_films = []
-        for film in film_list["hits"]["hits"]:
-            person_film = PersonFilm(id=film.get("_source").get("id"), roles=[])
-            for director in film.get("_source").get("directors"):
-                if director["id"] == person_id and "director" not in person_film.roles:
-                    person_film.roles.append("director")
-            for actor in film.get("_source").get("actors"):
-                if actor["id"] == person_id and "actor" not in person_film.roles:
-                    person_film.roles.append("actor")
-            for writer in film.get("_source").get("writers"):
-                if writer["id"] == person_id and "writer" not in person_film.roles:
-                    person_film.roles.append("writer")
-            person_films.append(person_film)
-        return person_films
+
+    async def _get_filmography_from_elastic(self, person_id) -> Filmography:
+        # Roles come from the named queries, so the crew arrays are not fetched,
+        # and search_after pages through filmographies of any length.
+        films = []
+        body = {
+            "query": self._person_films_query(person_id),
+            "sort": [{"imdb_rating": {"order": "desc"}}, {"id": {"order": "asc"}}],
+            "size": FILMOGRAPHY_PAGE_SIZE,
+            "track_total_hits": False,
+            "_source": FILM_FIELDS,
+        }
+        while True:
+            try:
+                response = await self.elastic.search(index="movies", body=body)
+            except NotFoundError:
+                break
+            hits = response["hits"]["hits"]
+            films += [
+                FilmographyFilm(**hit["_source"], roles=self._roles(hit))
+                for hit in hits
+            ]
+            if len(hits) < body["size"]:
+                break
+            body["search_after"] = hits[-1]["sort"]
+        return Filmography(films=films)
+
+    async def get_person_films(self, person_id: UUID) -> list[PersonFilm]:
+        filmography = await self.get_filmography(person_id)
+        return [PersonFilm(id=film.id, roles=film.roles) for film in filmography.films]
+
+    async def get_persons_films(self, person_ids: list) -> dict:
+        """Resolve filmographies of several persons with one msearch round trip."""
+        if not person_ids:
+            return {}
+
+        searches = []
+        for person_id in person_ids:
+            searches.append({"index": "movies"})
+            searches.append(
+                {
+                    "query": self._person_films_query(person_id),
+                    "size": settings.max_result_window,
+                    "track_total_hits": False,
+                    "_source": ["id"],
+                }
+            )
+        response = await self.elastic.msearch(searches=searches)
+
+        return {
+            person_id: [
+                PersonFilm(id=hit["_source"]["id"], roles=self._roles(hit))
+                for hit in result.get("hits", {}).get("hits", [])
+            ]
+            for person_id, result in zip(person_ids, response["responses"])
+        }
 
     async def get_by_id(self, person_id: UUID) -> Person | None:
-        person = await self._person_from_cache(person_id)
-        if not person:
-            person = await self._get_person_from_elastic(person_id)
-            if not person:
-                return None
-            await self._put_person_to_cache(person)
-        return person
+        return await self._get_or_fetch(
+            await self.cache_keys.detail(person_id),
+            lambda: self._get_person_from_elastic(person_id),
+            load=load_model(Person),
+            dump=dump_model,
+            expire=settings.person_cache_expire_in_seconds,
+            cache_missing=True,
+        )
+
+    async def get_many(self, person_ids: list) -> list[Person | None]:
+        return await self._get_many(
+            person_ids,
+            self._get_persons_by_ids,
+            load=load_model(Person),
+            dump=dump_model,
+            expire=settings.person_cache_expire_in_seconds,
+        )
+
+    async def _get_persons_by_ids(self, person_ids: list[str]) -> dict[str, Person]:
+        try:
+            response = await self.elastic.mget(index="persons", ids=person_ids)
+        except NotFoundError:
+            return {}
+        docs = [doc for doc in response["docs"] if doc.get("found")]
+        persons_films = await self.get_persons_films([doc["_id"] for doc in docs])
+        return {
+            doc["_id"]: Person(
+                id=doc["_source"]["id"],
+                full_name=doc["_source"]["full_name"],
+                films=persons_films[doc["_id"]],
+            )
+            for doc in docs
+        }
 
     async def get_list(self):
-        cache_key = "persons_list"
-        cached_data = await self.redis.get(cache_key)
-        if cached_data:
-            return [Person.parse_raw(person) for person in json.loads(cached_data)]
+        return await self._get_or_fetch(
+            await self.cache_keys.list("list"),
+            self._get_persons_from_elastic,
+            load=load_models(Person),
+            dump=dump_models,
+            expire=settings.person_cache_expire_in_seconds,
+        )
 
+    async def _get_persons_from_elastic(self):
         try:
             persons_list = await self.elastic.search(
                 index="persons", query={"match_all": {}}
@@ -90,57 +165,32 @@ class PersonService:
         except NotFoundError:
             return None
 
-        persons = [
+        return [
             Person(**get_person["_source"])
             for get_person in persons_list["hits"]["hits"]
         ]
-        await self.redis.set(
-            cache_key,
-            json.dumps([person.json() for person in persons]),
-            settings.person_cache_expire_in_seconds,
-        )
-
-        return persons
 
-    async def get_person_film_list(self, person_id):
-        try:
-            film_list = await self.elastic.search(
-                index="movies",
-                query={
-                    "bool": {
-                        "should": [
-                            {
-                                "nested": {
-                                    "path": "directors",
-                                    "query": {"term": {"directors.id": person_id}},
-                                },
-                            },
-                            {
-                                "nested": {
-                                    "path": "actors",
-                                    "query": {"term": {"actors.id": person_id}},
-                                },
-                            },
-                            {
-                                "nested": {
-                                    "path": "writers",
-                                    "query": {"term": {"writers.id": person_id}},
-                                }
-                            },
-                        ]
-                    }
-                },
-            )
-        except NotFoundError:
-            return None
-        return [Film(**film["_source"]) for film in film_list["hits"]["hits"]]
+    async def get_person_film_list(
+        self, person_id, page_number: int, page_size: int
+    ) -> list[Film]:
+        filmography = await self.get_filmography(person_id)
+        start = (page_number - 1) * page_size
+        end = start + page_size
+        return filmography.films[start:end]
 
     async def get_search_list(self, query, page_number, page_size):
-        cache_key = self._generate_cache_key(query, page_number, page_size)
-        cached_data = await self.redis.get(cache_key)
-        if cached_data:
-            return [Person.parse_raw(person) for person in json.loads(cached_data)]
+        query = normalize_query(query)
+        cache_key = await self.cache_keys.list("search", query, page_number, page_size)
 
+        return await self._get_or_fetch(
+            cache_key,
+            lambda: self._search_persons_in_elastic(query, page_number, page_size),
+            load=load_models(Person),
+            dump=dump_models,
+            expire=settings.person_cache_expire_in_seconds,
+        )
+
+    async def _search_persons_in_elastic(self, query, page_number, page_size):
         offset = (page_number - 1) * page_size
         try:
             persons_list = await self.elastic.search(
@@ -151,21 +201,16 @@ class PersonService:
             )
         except NotFoundError:
             return None
+        persons_films = await self.get_persons_films(
+            [get_person["_source"]["id"] for get_person in persons_list["hits"]["hits"]]
+        )
         for get_person in persons_list["hits"]["hits"]:
-            get_person["_source"]["films"] = await self.get_person_films(
-                get_person["_source"]["id"]
-            )
+            get_person["_source"]["films"] = persons_films[get_person["_source"]["id"]]
         persons = [
             Person(**get_person["_source"])
             for get_person in persons_list["hits"]["hits"]
         ]
-        logger.debug(f"Search person {persons}")
-        await self.redis.set(
-            cache_key,
-            json.dumps([person.json() for person in persons]),
-            settings.person_cache_expire_in_seconds,
-        )
-
+        logger.debug("Search person %s", persons)
         return persons
 
     async def _get_person_from_elastic(self, person_id: UUID) -> Person | None:
@@ -179,21 +224,11 @@ class PersonService:
 
         films = await self.get_person_films(answer["id"])
         answer["films"] = films
-        logger.debug(f"Retrieved person {answer} from elastic")
+        logger.debug("Retrieved person %s from elastic", answer)
         return Person(**answer)
 
-    async def _person_from_cache(self, person_id: UUID) -> Person | None:
-        data = await self.redis.get(str(person_id))
-        if not data:
-            return None
-        logger.debug(f"Retrieved person {person_id} from cache")
-        person = Person.parse_raw(data)
-        return person
-
-    async def _put_person_to_cache(self, person: Person):
-        await self.redis.set(
-            str(person.id), person.json(), settings.person_cache_expire_in_seconds
-        )
+    def export(self, batch_size: int, fields: list[str] | None = None):
+        return self._scan("persons", batch_size, fields)
 
 
 @lru_cache()
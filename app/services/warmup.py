@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable
+
+from core.config import settings
+from elasticsearch import AsyncElasticsearch, NotFoundError
+from redis.asyncio import Redis
+from redis.asyncio.lock import Lock
+from redis.exceptions import LockError
+from services.film import FilmService
+from services.genre import GenreService
+
+logger = logging.getLogger(__name__)
+
+WARMUP_LOCK_KEY = "warmup:lock"
+# Set for `warmup_lock_timeout_in_seconds` once a worker has warmed the cache.
+WARMUP_DONE_KEY = "warmup:done"
+
+# Sort parameters exactly as the films list endpoint passes them.
+FILM_SORTS = ([], ["imdb_rating"], ["-imdb_rating"])
+
+
+class WarmUp:
+    """Prefill the cache with the pages requested first after a deploy.
+
+    Every page is requested through the services, so it is cached under the
+    same key and with the same TTL as a regular request would cache it.
+    """
+
+    def __init__(self, redis: Redis, elastic: AsyncElasticsearch):
+        self.elastic = elastic
+        self.film_service = FilmService(redis, elastic)
+        self.genre_service = GenreService(redis, elastic)
+        self.semaphore = asyncio.Semaphore(settings.warmup_concurrency)
+        self.pages = range(1, settings.warmup_pages + 1)
+        self.page_size = settings.warmup_page_size
+
+    async def run(self) -> int:
+        started = time.perf_counter()
+        genre_ids = await self._warm_genres()
+        film_ids = await self._top_film_ids()
+
+        jobs = [
+            lambda sort=sort, genre=genre, page=page: self.film_service.get_list(
+                sort, genre, self.page_size, page
+            )
+            for sort in FILM_SORTS
+            for genre in [None, *genre_ids]
+            for page in self.pages
+        ]
+        jobs += [
+            lambda film_id=film_id: self.film_service.get_by_id(film_id)
+            for film_id in film_ids
+        ]
+        jobs += [
+            lambda genre_id=genre_id: self.genre_service.get_by_id(genre_id)
+            for genre_id in genre_ids
+        ]
+        warmed = sum(await asyncio.gather(*map(self._warm, jobs)))
+
+        logger.info(
+            "Cache warm-up of %s entries took %.1fs",
+            warmed,
+            time.perf_counter() - started,
+        )
+        return warmed
+
+    async def _warm(self, job: Callable[[], Awaitable]) -> int:
+        async with self.semaphore:
+            try:
+                await job()
+            except Exception:
+                logger.exception("Cache warm-up request failed")
+                return 0
+            return 1
+
+    async def _warm_genres(self) -> list[str]:
+        """Warm the genre list pages and return the ids of the listed genres."""
+        genre_ids = []
+        for page in self.pages:
+            genres = await self.genre_service.get_list(page, self.page_size)
+            genre_ids += [str(genre.id) for genre in genres or []]
+            if not genres or len(genres) < self.page_size:
+                break
+        return genre_ids
+
+    async def _top_film_ids(self) -> list[str]:
+        if not settings.warmup_top_films:
+            return []
+        try:
+            response = await self.elastic.search(
+                index="movies",
+                sort=[{"imdb_rating": {"order": "desc"}}],
+                size=settings.warmup_top_films,
+                source=["id"],
+            )
+        except NotFoundError:
+            return []
+        return [hit["_id"] for hit in response["hits"]["hits"]]
+
+
+async def warm_up(redis: Redis, elastic: AsyncElasticsearch) -> int:
+    return await WarmUp(redis, elastic).run()
+
+
+async def warm_up_once(redis: Redis, elastic: AsyncElasticsearch) -> int:
+    """Warm the cache from a single worker of the deployment.
+
+    The worker that takes the Redis lock runs the warm-up and sets the done
+    marker, the others wait for the marker. If the lock holder fails or dies,
+    a waiting worker takes the lock over and runs the warm-up itself.
+
+    A failed attempt is retried after `warmup_retry_interval_in_seconds`.
+    After `warmup_attempts` failures the worker gives up and starts serving
+    with a cold cache rather than never becoming ready.
+    """
+    lock = redis.lock(
+        WARMUP_LOCK_KEY,
+        timeout=settings.warmup_lock_timeout_in_seconds,
+        blocking=False,
+    )
+    for attempt in range(1, settings.warmup_attempts + 1):
+        try:
+            return await _warm_up_or_wait(redis, elastic, lock)
+        except Exception:
+            logger.exception(
+                "Cache warm-up attempt %s of %s failed",
+                attempt,
+                settings.warmup_attempts,
+            )
+        if attempt < settings.warmup_attempts:
+            await asyncio.sleep(settings.warmup_retry_interval_in_seconds)
+    logger.error("Cache warm-up gave up, serving with a cold cache")
+    return 0
+
+
+async def _warm_up_or_wait(
+    redis: Redis, elastic: AsyncElasticsearch, lock: Lock
+) -> int:
+    while not await redis.exists(WARMUP_DONE_KEY):
+        if await lock.acquire():
+            try:
+                warmed = await warm_up(redis, elastic)
+                await redis.set(
+                    WARMUP_DONE_KEY, 1, ex=settings.warmup_lock_timeout_in_seconds
+                )
+                return warmed
+            finally:
+                try:
+                    await lock.release()
+                except LockError:
+                    logger.warning("Cache warm-up lock expired before release")
+        await asyncio.sleep(settings.warmup_poll_interval_in_seconds)
+    logger.info("Cache was warmed up by another worker")
+    return 0
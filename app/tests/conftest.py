@@ -0,0 +1 @@
+import benchmarks  # noqa: F401
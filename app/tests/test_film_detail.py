@@ -0,0 +1,68 @@
+"""Elasticsearch round trips of film detail cache misses."""
+import asyncio
+
+import fakeredis
+import pytest
+from benchmarks.fakes import FakeElasticsearch, load_documents
+from services.film import FilmService
+from services.genre_catalog import genre_catalog
+
+FILMS = load_documents("movies")
+
+
+def film_with_genres(count: int) -> str:
+    return next(
+        film_id
+        for film_id, source in FILMS.items()
+        if len(set(source.get("genres", []))) == count
+    )
+
+
+def get_detail(elastic: FakeElasticsearch, film_id: str, redis=None):
+    service = FilmService(redis or fakeredis.FakeAsyncRedis(), elastic)
+    return asyncio.run(service.get_by_id(film_id))
+
+
+@pytest.fixture
+def no_catalog(monkeypatch):
+    async def unavailable(elastic, redis):
+        return None
+
+    monkeypatch.setattr(genre_catalog, "get", unavailable)
+
+
+@pytest.mark.parametrize("genre_count", [1, 3, 9])
+def test_miss_without_catalog_resolves_genres_with_one_msearch(no_catalog, genre_count):
+    elastic = FakeElasticsearch()
+    film_id = film_with_genres(genre_count)
+
+    film = get_detail(elastic, film_id)
+
+    assert {genre.name for genre in film.genres} == set(FILMS[film_id]["genres"])
+    assert elastic.calls == {"get": 1, "msearch": 1}
+
+
+@pytest.mark.parametrize("genre_count", [1, 3, 9])
+def test_miss_with_catalog_resolves_genres_without_msearch(genre_count):
+    elastic = FakeElasticsearch()
+    redis = fakeredis.FakeAsyncRedis()
+    asyncio.run(genre_catalog.refresh(elastic, redis))
+    elastic.reset_calls()
+    film_id = film_with_genres(genre_count)
+
+    film = get_detail(elastic, film_id, redis)
+
+    assert {genre.name for genre in film.genres} == set(FILMS[film_id]["genres"])
+    assert elastic.calls == {"get": 1}
+
+
+def test_batch_miss_without_catalog_resolves_genres_with_one_msearch(no_catalog):
+    elastic = FakeElasticsearch()
+    service = FilmService(fakeredis.FakeAsyncRedis(), elastic)
+    film_ids = list(FILMS)[:40]
+
+    films = asyncio.run(service.get_many(film_ids))
+
+    for film_id, film in zip(film_ids, films):
+        assert {genre.name for genre in film.genres} == set(FILMS[film_id]["genres"])
+    assert elastic.calls == {"mget": 1, "msearch": 1}
@@ -0,0 +1,74 @@
+"""Cursor pagination of the films list in a point in time."""
+import asyncio
+
+import fakeredis
+import pytest
+from benchmarks.fakes import FakeElasticsearch
+from core.config import settings
+from services.film import FilmService
+
+SORT = ["-imdb_rating"]
+
+
+@pytest.fixture
+def pit_enabled(monkeypatch):
+    monkeypatch.setattr(settings, "films_pit_enabled", True)
+
+
+def film_ids(page) -> list[str]:
+    return [str(film.id) for film in page.films]
+
+
+async def offset_pages(elastic, count: int, page_size: int) -> list[list[str]]:
+    service = FilmService(fakeredis.FakeAsyncRedis(), elastic)
+    return [
+        film_ids(await service.get_list(SORT, None, page_size, page))
+        for page in range(1, count + 1)
+    ]
+
+
+def test_second_page_continues_the_first(pit_enabled):
+    elastic = FakeElasticsearch()
+    service = FilmService(fakeredis.FakeAsyncRedis(), elastic)
+
+    async def walk():
+        first = await service.get_list(SORT, None, 10, 1)
+        second = await service.get_list(SORT, None, 10, 1, first.next_cursor)
+        return film_ids(first), film_ids(second)
+
+    pages = list(asyncio.run(walk()))
+
+    assert elastic.calls["open_point_in_time"] == 1
+    assert pages == asyncio.run(offset_pages(elastic, 2, 10))
+
+
+def test_expired_point_in_time_continues_on_the_live_index(pit_enabled):
+    elastic = FakeElasticsearch()
+    service = FilmService(fakeredis.FakeAsyncRedis(), elastic)
+
+    async def walk():
+        first = await service.get_list(SORT, None, 10, 1)
+        elastic._pits.clear()
+        second = await service.get_list(SORT, None, 10, 1, first.next_cursor)
+        return film_ids(second)
+
+    assert asyncio.run(walk()) == asyncio.run(offset_pages(elastic, 2, 10))[1]
+
+
+def test_last_page_closes_the_point_in_time(pit_enabled):
+    elastic = FakeElasticsearch()
+    service = FilmService(fakeredis.FakeAsyncRedis(), elastic)
+
+    async def walk() -> int:
+        films = 0
+        cursor = None
+        while True:
+            page = await service.get_list(SORT, None, 100, 1, cursor)
+            films += len(page.films)
+            cursor = page.next_cursor
+            if cursor is None:
+                return films
+
+    assert asyncio.run(walk()) == len(elastic.indices["movies"])
+    assert elastic.calls["close_point_in_time"] == 1
+    assert not elastic._pits
@@ -0,0 +1,48 @@
+"""Invalidation of the per-process genre catalog."""
+import asyncio
+
+import fakeredis
+from benchmarks.fakes import FakeElasticsearch
+from core.cache_keys import bump_generation
+from services.genre import GenreService
+from services.genre_catalog import genre_catalog
+
+
+def test_bumped_generation_reloads_the_catalog():
+    elastic = FakeElasticsearch()
+    service = GenreService(fakeredis.FakeAsyncRedis(), elastic)
+    genre_id, source = next(iter(elastic.indices["genres"].items()))
+
+    async def rename(namespace: str | None) -> str:
+        await service.get_by_id(genre_id)
+        source["name"] = f"renamed {namespace}"
+        await bump_generation(service.redis, namespace)
+        return (await service.get_by_id(genre_id)).name
+
+    for namespace in (None, "genre"):
+        assert asyncio.run(rename(namespace)) == f"renamed {namespace}"
+
+
+def test_entity_invalidation_reloads_the_catalog():
+    elastic = FakeElasticsearch()
+    service = GenreService(fakeredis.FakeAsyncRedis(), elastic)
+    genre_id, source = next(iter(elastic.indices["genres"].items()))
+
+    async def rename() -> list[str]:
+        await service.get_list(1, 50)
+        source["name"] = "renamed"
+        await service.invalidate_entity(genre_id)
+        return [genre.name for genre in await service.get_list(1, 50)]
+
+    assert "renamed" in asyncio.run(rename())
+
+
+def test_catalog_is_not_reloaded_without_a_bump():
+    elastic = FakeElasticsearch()
+    redis = fakeredis.FakeAsyncRedis()
+    asyncio.run(genre_catalog.refresh(elastic, redis))
+    elastic.reset_calls()
+
+    asyncio.run(genre_catalog.get(elastic, redis))
+
+    assert not elastic.calls
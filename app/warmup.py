@@ -0,0 +1,28 @@
+"""Prefill the cache with the most requested pages, e.g. after a Redis restart.
+
+    python warmup.py
+"""
+import argparse
+import asyncio
+
+from core.config import settings
+from elasticsearch import AsyncElasticsearch
+from redis.asyncio import Redis
+from services.warmup import warm_up
+
+
+async def main():
+    redis = Redis.from_url(settings.redis_dsn)
+    elastic = AsyncElasticsearch(hosts=[settings.elastic_dsn])
+    try:
+        await warm_up(redis, elastic)
+    finally:
+        await redis.close()
+        await elastic.close()
+
+
+if __name__ == "__main__":
+    argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    ).parse_args()
+    asyncio.run(main())